@@ -0,0 +1,286 @@
+"""In-memory Ultron API serving a synthetic inventory, for trying and benchmarking the CLI.
+
+Usage: python benchmarks/mockserver.py [port] [clients]
+
+Clients are generated from their index when requested, so inventories of a
+million clients take no memory until changed through the API. Serves the
+/admins, /groups/{admin}/{inventory} and /clients/{admin}/{inventory}
+routes with fields, dynfields and the *names filters.
+
+Connect with: ultron connect http://127.0.0.1:5050/api/v1.0 -u admin -p admin -i test
+"""
+import sys
+import json
+import socket
+import threading
+import socketserver
+from collections import OrderedDict
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+
+KERNELS = ['4.{}.{}'.format(a, b) for a in range(20) for b in range(10)]
+OWNERS = ['ops', 'web', 'db', 'infra']
+ENVS = ['prod', 'stage', 'dev']
+TASKS = ['ping', 'update', 'reboot']
+STATUSES = ['SUCCESS', 'FAILED', 'PENDING']
+GROUPS = ['web', 'db', 'edge', 'batch']
+
+# Listings are sent in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+
+def clientname(i):
+    return 'host{:07d}'.format(i)
+
+
+def synthetic(i):
+    "Client number i, the same on every call"
+    h = (i * 2654435761) % 2 ** 32
+    return {
+        'name': clientname(i),
+        'props': {'rack': 'rack-{}'.format(i % 50), 'owner': OWNERS[h % 4], 'env': ENVS[(h >> 2) % 3]},
+        'state': {'kernel': KERNELS[(h >> 4) % len(KERNELS)], 'os': ['rhel7', 'ubuntu16'][(h >> 12) % 2],
+                  'up': (h >> 13) % 10 != 0},
+        'tasks': {x: {'status': STATUSES[(h >> (14 + 2 * j)) % 3]} for j, x in enumerate(TASKS[:i % 4])},
+        'groups': [x for j, x in enumerate(GROUPS) if (h >> (20 + j)) % 3 == 0],
+        'last_modified': i
+    }
+
+
+class Clients(object):
+    "Synthetic clients generated on demand, with the changes made through the API on top"
+
+    def __init__(self, count):
+        self.count = count
+        self.changed = OrderedDict()
+        self.version = count
+        self.lock = threading.Lock()
+
+    def index(self, name):
+        if len(name) == 11 and name.startswith('host') and name[4:].isdigit() and int(name[4:]) < self.count:
+            return int(name[4:])
+        return None
+
+    def get(self, name):
+        if name in self.changed:
+            return self.changed[name]
+        i = self.index(name)
+        return None if i is None else synthetic(i)
+
+    def names(self):
+        for i in range(self.count):
+            name = clientname(i)
+            if self.changed.get(name, True) is not None:
+                yield name
+        for name, client in list(self.changed.items()):
+            if client is not None and self.index(name) is None:
+                yield name
+
+    def put(self, name, client):
+        with self.lock:
+            self.version += 1
+            client['last_modified'] = self.version
+            self.changed[name] = client
+
+    def delete(self, name):
+        with self.lock:
+            self.changed[name] = None
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+            self.changed.clear()
+
+
+def inventory(count):
+    "Admins, groups and clients of a synthetic inventory"
+    admins = {'admin': {
+        'name': 'admin', 'props': {},
+        'allowed_tasks': OrderedDict((x, {'title': x.title(), 'plugin': x, 'index': i}) for i, x in enumerate(TASKS)),
+        'inventories': {'test': {'clients': count, 'groups': len(GROUPS)}}
+    }}
+    groups = OrderedDict((x, {'name': x, 'description': '', 'props': {}}) for x in GROUPS)
+    return {'admins': admins, 'groups': groups, 'clients': Clients(count)}
+
+
+def project(item, query):
+    "Keep the fields and dynfields asked for, everything without fields"
+    if 'fields' not in query:
+        return item
+    keys = set(query['fields'][0].split(','))
+    if 'dynfields' in query:
+        keys.update(query['dynfields'][0].split(','))
+    return {k: v for k, v in item.items() if k in keys}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    data = None
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # Headers and body are written separately, without this every reply waits for a delayed ACK
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        try:
+            BaseHTTPRequestHandler.handle(self)
+        except ConnectionError:
+            # The CLI exits without closing its keep-alive connections
+            pass
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, obj, code=200):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, items):
+        "Send the result object of (name, record) pairs in chunks while generating it"
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        parts, size, sep = ['{"result": {'], 0, ''
+        for name, record in items:
+            part = '{}{}: {}'.format(sep, json.dumps(name), json.dumps(record))
+            parts.append(part)
+            size += len(part)
+            sep = ', '
+            if size >= CHUNK_SIZE:
+                self.chunk(''.join(parts))
+                parts, size = [], 0
+        parts.append('}}')
+        self.chunk(''.join(parts))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write('{:x}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+
+    def form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+
+    def route(self):
+        "Kind, path remainder and query of the request"
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')[2:]
+        if parts[0] == 'admins':
+            return 'admins', parts[1:], parse_qs(url.query)
+        return parts[0], parts[3:], parse_qs(url.query)
+
+    def dynamic(self, kind, record, query):
+        "Record with the dynfields computed on request"
+        dynfields = query.get('dynfields', [''])[0].split(',')
+        if kind == 'groups' and 'count_clients' in dynfields:
+            clients = self.data['clients']
+            count = sum(1 for x in clients.names() if record['name'] in clients.get(x)['groups'])
+            record = dict(record, count_clients=count)
+        return project(record, query)
+
+    def do_GET(self):
+        kind, rest, query = self.route()
+        key = kind[:-1] + 'names'
+        if kind == 'clients':
+            clients = self.data['clients']
+            get, names = clients.get, clients.names
+        else:
+            items = self.data[kind]
+            get, names = items.get, items.keys
+        if len(rest) > 0:
+            wanted = [rest[0]]
+        elif key in query:
+            wanted = query[key][0].split(',')
+        else:
+            wanted = names()
+        found = ((x, get(x)) for x in wanted)
+        self.send_stream((k, self.dynamic(kind, v, query)) for k, v in found if v is not None)
+
+    def do_POST(self):
+        kind, rest, _ = self.route()
+        form = self.form()
+        clients = self.data['clients']
+        if len(rest) > 0 and kind == 'groups':
+            # Group membership and group tasks
+            for name in (form['clientnames'].split(',') if form.get('clientnames') else []):
+                client = dict(clients.get(name))
+                groups = [x for x in client['groups'] if x != rest[0]]
+                client['groups'] = groups if form.get('action') == 'remove' else groups + [rest[0]]
+                clients.put(name, client)
+            if 'task' in form:
+                self.perform([x for x in clients.names() if rest[0] in clients.get(x)['groups']], form)
+            return self.send({'result': {}})
+
+        key = kind[:-1] + 'names'
+        if kind == 'clients':
+            names = form[key].split(',') if form.get(key) else list(clients.names())
+        else:
+            names = form[key].split(',') if form.get(key) else list(self.data[kind].keys())
+        if 'task' in form:
+            self.perform(names, form)
+            return self.send({'result': {}})
+        for name in names:
+            if kind == 'clients':
+                client = dict(clients.get(name) or {'name': name, 'props': {}, 'state': {}, 'tasks': {}, 'groups': []})
+                if 'props' in form:
+                    client['props'] = json.loads(form['props'])
+                clients.put(name, client)
+                continue
+            item = self.data[kind].setdefault(name, {'name': name, 'props': {}})
+            if 'props' in form:
+                item['props'] = json.loads(form['props'])
+            if 'description' in form:
+                item['description'] = form['description']
+        self.send({'result': {}})
+
+    def perform(self, names, form):
+        clients = self.data['clients']
+        status = 'PENDING' if form.get('async') == '1' else 'SUCCESS'
+        for name in names:
+            client = dict(clients.get(name))
+            client['tasks'] = dict(client['tasks'], **{form['task']: {'status': status}})
+            clients.put(name, client)
+
+    def do_DELETE(self):
+        kind, _, _ = self.route()
+        form = self.form()
+        key = kind[:-1] + 'names'
+        if kind == 'clients':
+            if not form.get(key):
+                self.data['clients'].clear()
+            for name in (form[key].split(',') if form.get(key) else []):
+                self.data['clients'].delete(name)
+        else:
+            for name in (form[key].split(',') if form.get(key) else list(self.data[kind].keys())):
+                self.data[kind].pop(name, None)
+        self.send({'result': {}})
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    "http.server.ThreadingHTTPServer, which needs Python 3.7"
+    daemon_threads = True
+
+
+def serve(port, count):
+    Handler.data = inventory(count)
+    return ThreadingHTTPServer(('127.0.0.1', port), Handler)
+
+
+def main(argv=sys.argv[1:]):
+    port = int(argv[0]) if len(argv) > 0 else 5050
+    count = int(argv[1]) if len(argv) > 1 else 1000
+    server = serve(port, count)
+    print('Serving {} clients on http://127.0.0.1:{}/api/v1.0'.format(count, port))
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
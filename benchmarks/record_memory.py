@@ -0,0 +1,57 @@
+"""Compare the memory held by plain dict and compact client records.
+
+Usage: python benchmarks/record_memory.py [clients]
+"""
+import sys
+import gc
+import json
+import random
+import tracemalloc
+from ultron_cli.records import Client
+
+
+KERNELS = ['4.{}.{}'.format(a, b) for a in range(20) for b in range(10)]
+TASKS = ['ping', 'update', 'reboot']
+GROUPS = ['web', 'db', 'edge', 'batch']
+
+
+def synthetic(count):
+    "JSON documents of count synthetic clients, as a listing would carry them"
+    random.seed(0)
+    for i in range(count):
+        yield json.dumps({
+            'name': 'host{:06d}.example.com'.format(i),
+            'props': {
+                'rack': 'rack-{}'.format(i % 50),
+                'owner': random.choice(['ops', 'web', 'db', 'infra']),
+                'env': random.choice(['prod', 'stage', 'dev'])
+            },
+            'state': {
+                'kernel': random.choice(KERNELS),
+                'os': random.choice(['rhel7', 'ubuntu16']),
+                'up': random.random() < 0.9
+            },
+            'tasks': {x: {'status': random.choice(['SUCCESS', 'FAILED', 'PENDING'])} for x in TASKS[:i % 4]},
+            'groups': random.sample(GROUPS, i % 3)
+        })
+
+
+def measure(docs, convert):
+    gc.collect()
+    tracemalloc.start()
+    held = [convert(json.loads(x)) for x in docs]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, len(held)
+
+
+def main(argv=sys.argv[1:]):
+    count = int(argv[0]) if argv else 100000
+    docs = list(synthetic(count))
+    for name, convert in [('dict', lambda x: x), ('Client', Client.from_dict)]:
+        size, held = measure(docs, convert)
+        print('{:8} {:8.1f} MB {:8d} B/client'.format(name, size / 2.0 ** 20, size // held))
+
+
+if __name__ == '__main__':
+    main()
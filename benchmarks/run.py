@@ -0,0 +1,162 @@
+"""Run every command against the mock server and record latency, throughput and peak RSS.
+
+Usage: python benchmarks/run.py [-c clients] [-r runs] [-k match] [--json out.json]
+                                [--baseline base.json] [--tolerance 0.2]
+
+Starts benchmarks/mockserver.py with a synthetic inventory, then runs the
+cases below in order, each round leaving the inventory as it found it.
+With --baseline, exits 1 when a case's median time or peak RSS grew by
+more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+
+
+# Name, arguments, whether it reads the whole inventory
+CASES = [
+    ('list clients', ['list', 'clients', '-f', 'value'], True),
+    ('list groups', ['list', 'groups'], False),
+    ('list tasks', ['list', 'tasks'], False),
+    ('show client', ['show', 'client', 'host0000001'], False),
+    ('stat client tasks', ['stat', 'client', 'tasks'], True),
+    ('stat client states', ['stat', 'client', 'states'], True),
+    ('stat client props', ['stat', 'client', 'props'], True),
+    ('stat client all', ['stat', 'client', 'all'], True),
+    ('filter client task', ['filter', 'client', 'task', 'ping', 'FAILED', '-f', 'value'], True),
+    ('filter client state', ['filter', 'client', 'state', 'os', 'rhel7', '-f', 'value'], True),
+    ('filter client prop', ['filter', 'client', 'prop', 'env', 'prod', '-f', 'value'], True),
+    ('sync', ['sync'], True),
+    ('stat client tasks -L', ['stat', 'client', 'tasks', '-L'], True),
+    ('new clients', ['new', 'clients', 'bench-1', 'bench-2', '-P', 'env=bench'], False),
+    ('update clients', ['update', 'clients', 'bench-1', 'bench-2', '-P', 'env=bench2'], False),
+    ('append clients to group', ['append', 'clients', 'to', 'group', 'web', 'bench-1', 'bench-2'], False),
+    ('perform on clients', ['perform', 'on', 'clients', 'ping', 'bench-1', 'bench-2', '-S'], False),
+    ('remove clients from group', ['remove', 'clients', 'from', 'group', 'web', 'bench-1', 'bench-2'], False),
+    ('delete clients', ['delete', 'clients', 'bench-1', 'bench-2'], False),
+]
+
+MOCKSERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mockserver.py')
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def freeport():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def start(clients):
+    "Start the mock server, returning the process and its endpoint"
+    port = freeport()
+    server = subprocess.Popen([sys.executable, MOCKSERVER, str(port), str(clients)],
+                              stdout=subprocess.PIPE, universal_newlines=True)
+    server.stdout.readline()
+    return server, 'http://127.0.0.1:{}/api/v1.0'.format(port)
+
+
+def measure(argv, env):
+    "Run a command, returning its exit code, wall time in ms and peak RSS in MB"
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, '-m', 'ultron_cli.main'] + argv, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    ms = (time.time() - start) * 1000
+    # os.waitstatus_to_exitcode needs Python 3.9
+    proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return proc.returncode, ms, usage.ru_maxrss / 1024.0
+
+
+def regressions(results, baseline, tolerance):
+    "Cases slower or larger than the baseline allows"
+    found = []
+    for name, result in sorted(results.items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        for key in ('median_ms', 'rss_mb'):
+            if result[key] > base[key] * (1 + tolerance):
+                found.append('{}: {} {:.1f} > {:.1f}'.format(name, key, result[key], base[key]))
+    return found
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--clients', type=int, default=10000, help='Clients in the synthetic inventory')
+    parser.add_argument('-r', '--runs', type=int, default=5, help='Rounds over all cases')
+    parser.add_argument('-k', '--match', default='', help='Only run cases containing this')
+    parser.add_argument('--json', default=None, help='Write the results to this file')
+    parser.add_argument('--baseline', default=None, help='Results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed growth over the baseline')
+    p = parser.parse_args(argv)
+
+    cases = [x for x in CASES if p.match in x[0]]
+    server, endpoint = start(p.clients)
+    home = tempfile.mkdtemp()
+    env = dict(os.environ, HOME=home, ULTRON_AGENT='0')
+    env.pop('ULTRON_PROFILE', None)
+    with open(os.path.join(home, '.ultron_session.json'), 'w') as f:
+        json.dump({'username': 'admin', 'password': 'admin', 'endpoint': endpoint,
+                   'inventory': 'test', 'certfile': False}, f)
+
+    times = {x[0]: [] for x in cases}
+    rss = {x[0]: 0.0 for x in cases}
+    errors = {x[0]: 0 for x in cases}
+    try:
+        if any('-L' in x[1] for x in cases):
+            # Cases reading the local snapshot need one to exist
+            measure(['sync'], env)
+        for _ in range(p.runs):
+            for name, args, _ in cases:
+                code, ms, mb = measure(args, env)
+                times[name].append(ms)
+                rss[name] = max(rss[name], mb)
+                errors[name] += code != 0
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(home)
+
+    results = {}
+    print('{:28} {:>10} {:>10} {:>12} {:>9} {:>7}'.format('case', 'median ms', 'p95 ms', 'clients/s', 'RSS MB', 'errors'))
+    for name, _, whole in cases:
+        median = percentile(times[name], 0.5)
+        rate = p.clients / (median / 1000) if whole else None
+        results[name] = {'median_ms': median, 'p95_ms': percentile(times[name], 0.95),
+                         'clients_per_s': rate, 'rss_mb': rss[name], 'errors': errors[name]}
+        print('{:28} {:10.1f} {:10.1f} {:>12} {:9.1f} {:7}'.format(
+            name, median, results[name]['p95_ms'], '{:.0f}'.format(rate) if rate else '-', rss[name], errors[name]))
+
+    if p.json:
+        with open(p.json, 'w') as f:
+            json.dump({'clients': p.clients, 'runs': p.runs, 'results': results}, f, indent=2, sort_keys=True)
+
+    failed = [name for name in results if results[name]['errors'] > 0]
+    for name in failed:
+        print('FAILED: {} exited non-zero'.format(name))
+    if p.baseline:
+        with open(p.baseline) as f:
+            baseline = json.load(f)
+        if baseline['clients'] != p.clients:
+            print('WARNING: baseline was recorded with {} clients'.format(baseline['clients']))
+        found = regressions(results, baseline, p.tolerance)
+        for line in found:
+            print('REGRESSION: ' + line)
+        failed.extend(found)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
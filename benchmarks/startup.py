@@ -0,0 +1,94 @@
+"""Measure CLI startup time and fail when it regresses.
+
+Usage: python benchmarks/startup.py [runs] [max-ms]
+
+Exits 1 when the median startup of a case exceeds max-ms (default 500), or
+when a deferred dependency or an unused command module is imported.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+
+CASES = [
+    ['--version'],
+    ['list', 'clients', '--help'],
+    ['stat', 'client', 'tasks', '--help'],
+    ['new', 'admins', '--help'],
+]
+
+# Imported only by the commands that need them
+DEFERRED = ['numpy', 'prompt_toolkit', 'yaml']
+
+# Loaded by the CLI itself, any other ultron_cli module belongs to a command
+CORE = {'ultron_cli', 'ultron_cli.main', 'ultron_cli.app', 'ultron_cli.agent', 'ultron_cli.config',
+        'ultron_cli.commands', 'ultron_cli.context', 'ultron_cli.trace'}
+
+PROBE = '''
+import sys, json
+from ultron_cli.main import main
+try:
+    main({argv!r})
+except SystemExit:
+    pass
+with open({out!r}, 'w') as f:
+    json.dump(sorted(sys.modules), f)
+'''
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def timed(argv, env):
+    start = time.time()
+    subprocess.call([sys.executable, '-m', 'ultron_cli.main'] + argv, env=env,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.time() - start) * 1000
+
+
+def imported(argv, env, home):
+    out = os.path.join(home, 'modules.json')
+    subprocess.call([sys.executable, '-c', PROBE.format(argv=argv, out=out)], env=env,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(out) as f:
+        return json.load(f)
+
+
+def main(argv=sys.argv[1:]):
+    runs = int(argv[0]) if len(argv) > 0 else 9
+    max_ms = float(argv[1]) if len(argv) > 1 else 500
+    home = tempfile.mkdtemp()
+    env = dict(os.environ, HOME=home)
+    with open(os.path.join(home, '.ultron_session.json'), 'w') as f:
+        json.dump({'username': 'bench', 'password': 'bench', 'endpoint': 'http://localhost:5050/api/v1.0',
+                   'inventory': 'test', 'certfile': False}, f)
+
+    failed = False
+    try:
+        for case in CASES:
+            ms = median([timed(case, env) for _ in range(runs)])
+            modules = imported(case, env, home)
+            deferred = [x for x in DEFERRED if x in modules]
+            commands = sorted(x for x in modules if x.startswith('ultron_cli.') and x not in CORE)
+            problems = []
+            if ms > max_ms:
+                problems.append('slower than {:.0f} ms'.format(max_ms))
+            if deferred:
+                problems.append('imports {}'.format(', '.join(deferred)))
+            if case[0].startswith('-') and commands:
+                problems.append('imports {}'.format(', '.join(commands)))
+            failed = failed or len(problems) > 0
+            print('{:32} {:8.1f} ms  {}'.format(' '.join(case), ms, '; '.join(problems) or 'ok'))
+    finally:
+        shutil.rmtree(home)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
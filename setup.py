@@ -2,6 +2,7 @@ from setuptools import setup, find_packages
 from codecs import open
 from os import path
 from ultron_cli.config import VERSION
+from ultron_cli.commands import COMMANDS
 
 here = path.abspath(path.dirname(__file__))
 
@@ -30,11 +31,9 @@ setup(
         'Development Status :: 3 - Alpha',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Natural Language :: English',
-        'Programming Language :: Python :: 3.2',
         'Intended Audience :: Developers',
         'Intended Audience :: Information Technology',
         'Intended Audience :: System Administrators',
@@ -42,10 +41,15 @@ setup(
         'Operating System :: POSIX'
     ],
 
+    python_requires='>=3.6',
+
     scripts=[],
 
     provides=[],
     install_requires=install_requirements,
+    extras_require={
+        'columnar': ['numpy']
+    },
 
     namespace_packages=[],
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
@@ -55,41 +59,9 @@ setup(
         'console_scripts': [
             'ultron = ultron_cli.main:main'
         ],
-        'ultron.cli': [
-            'connect = ultron_cli.session:Connect',
-            'disconnect = ultron_cli.session:Disconnect',
-            'inventory = ultron_cli.session:DefaultInventory',
-
-            'new admins = ultron_cli.admins:New',
-            'list admins = ultron_cli.admins:List',
-            'update admins = ultron_cli.admins:Update',
-            'delete admins = ultron_cli.admins:Delete',
-            'show admin = ultron_cli.admins:Show',
-
-            'list tasks = ultron_cli.admins:ListTasks',
-            'list inventories = ultron_cli.admins:ListInventories',
-
-            'new groups = ultron_cli.groups:New',
-            'list groups = ultron_cli.groups:List',
-            'update groups = ultron_cli.groups:Update',
-            'delete groups = ultron_cli.groups:Delete',
-            'show group = ultron_cli.groups:Show',
-            'perform on group = ultron_cli.groups:Perform',
-            'append clients to group = ultron_cli.groups:AppendClients',
-            'remove clients from group = ultron_cli.groups:RemoveClients',
-
-            'new clients = ultron_cli.clients:New',
-            'list clients = ultron_cli.clients:List',
-            'update clients = ultron_cli.clients:Update',
-            'delete clients = ultron_cli.clients:Delete',
-            'perform on clients = ultron_cli.clients:Perform',
-            'stat client tasks = ultron_cli.clients:StatTasks',
-            'filter client task = ultron_cli.clients:FilterTask',
-            'filter client state = ultron_cli.clients:FilterState',
-            'filter client prop = ultron_cli.clients:FilterProp',
-            'stat client states = ultron_cli.clients:StatStates',
-            'stat client props = ultron_cli.clients:StatProps',
-            'show client = ultron_cli.clients:Show'
+        'ultron.cli': ['{} = {}'.format(*x) for x in COMMANDS],
+        'cliff.formatter.list': [
+            'jsonl = ultron_cli.formatters:JSONLinesFormatter'
         ]
     },
 
@@ -0,0 +1,116 @@
+import json
+import pytest
+from ultron_cli.manifest import Apply
+
+ENDPOINT = 'http://ultron/api/v1.0'
+ADMINS = ENDPOINT + '/admins'
+CLIENTS = ENDPOINT + '/clients/admin/test'
+GROUPS = ENDPOINT + '/groups/admin/test'
+
+
+class Session(object):
+    endpoint = ENDPOINT
+    username = 'admin'
+
+
+class FixedApply(Apply):
+    "Plans against a fixed server state instead of fetching it"
+
+    def __init__(self, state):
+        super(FixedApply, self).__init__(None, None)
+        self.state = state
+        self.fetched = []
+
+    def fetch(self, session, url, params):
+        self.fetched.append(url)
+        return self.state.get(url, {})
+
+
+STATE = {
+    ADMINS: {'admin': {'props': {}}, 'old': {'props': {}}},
+    CLIENTS: {
+        'web1': {'name': 'web1', 'props': {'env': 'prod'}, 'groups': ['web']},
+        'web2': {'name': 'web2', 'props': {'env': 'dev'}, 'groups': []},
+        'db1': {'name': 'db1', 'props': {}, 'groups': ['web']},
+    },
+    GROUPS: {'web': {'description': 'Web', 'props': {}}, 'stale': {'description': '', 'props': {}}},
+}
+
+
+def plan(manifest, prune=False):
+    return [[(x.method, x.url, x.data) for x in phase]
+            for phase in FixedApply(STATE).plan(Session(), manifest, 'admin', 'test', prune)]
+
+
+def test_nothing_to_change():
+    manifest = {
+        'admins': {'admin': None, 'old': None},
+        'clients': {'web1': {'props': {'env': 'prod'}}, 'web2': None, 'db1': None},
+        'groups': {'web': {'description': 'Web', 'clients': ['web1', 'db1']}, 'stale': None},
+    }
+    assert plan(manifest) == [[], [], [], []]
+    assert plan(manifest, prune=True) == [[], [], [], []]
+
+
+def test_creates_grouped_by_payload():
+    creates, updates, members, deletes = plan({'clients': {
+        'new1': {'props': {'env': 'prod'}}, 'new2': {'props': {'env': 'prod'}}, 'new3': None, 'web1': None}})
+    assert creates == [
+        ('POST', CLIENTS, {'props': json.dumps({'env': 'prod'}), 'clientnames': 'new1,new2'}),
+        ('POST', CLIENTS, {'props': json.dumps({}), 'clientnames': 'new3'}),
+    ]
+    assert updates == members == deletes == []
+
+
+def test_updates_only_changed_props():
+    _, updates, _, _ = plan({'clients': {'web1': {'props': {'env': 'prod'}}, 'web2': {'props': {'env': 'prod'}}},
+                             'admins': {'old': {'props': {'team': 'ops'}}}})
+    assert updates == [
+        ('POST', ADMINS, {'props': json.dumps({'team': 'ops'}), 'adminnames': 'old'}),
+        ('POST', CLIENTS, {'props': json.dumps({'env': 'prod'}), 'clientnames': 'web2'}),
+    ]
+
+
+def test_group_membership():
+    creates, updates, members, _ = plan({'groups': {
+        'web': {'description': 'Frontends', 'clients': ['web1', 'web2']}, 'db': {'clients': ['db1']}}})
+    assert creates == [('POST', GROUPS, {'groupnames': 'db'})]
+    assert updates == [('POST', GROUPS, {'description': 'Frontends', 'groupnames': 'web'})]
+    assert members == [
+        ('POST', GROUPS + '/web', {'clientnames': 'web2'}),
+        ('POST', GROUPS + '/web', {'clientnames': 'db1', 'action': 'remove'}),
+        ('POST', GROUPS + '/db', {'clientnames': 'db1'}),
+    ]
+
+
+def test_membership_of_clients_created_by_the_manifest():
+    _, _, members, _ = plan({'clients': {'new1': None}, 'groups': {'web': {'clients': ['web1', 'db1', 'new1']}}})
+    assert members == [('POST', GROUPS + '/web', {'clientnames': 'new1'})]
+
+
+def test_membership_of_unknown_clients():
+    with pytest.raises(RuntimeError, match='clients not found: nosuch'):
+        plan({'groups': {'web': {'clients': ['web1', 'nosuch']}}})
+
+
+def test_prune_deletes_groups_first():
+    _, _, _, deletes = plan({'clients': {'web1': None}, 'groups': {'web': None}}, prune=True)
+    assert deletes == [
+        ('DELETE', GROUPS, {'groupnames': 'stale'}),
+        ('DELETE', CLIENTS, {'clientnames': 'db1,web2'}),
+    ]
+
+
+def test_prune_only_sections_in_the_manifest():
+    assert plan({'clients': {'web1': None, 'web2': None, 'db1': None}}, prune=True) == [[], [], [], []]
+
+
+def test_prune_keeps_own_admin():
+    _, _, _, deletes = plan({'admins': {}}, prune=True)
+    assert deletes == [('DELETE', ADMINS, {'adminnames': 'old'})]
+
+
+def test_admins_only_skips_client_listing():
+    apply = FixedApply(STATE)
+    apply.plan(Session(), {'admins': {'admin': None}}, 'admin', 'test', False)
+    assert apply.fetched == [ADMINS]
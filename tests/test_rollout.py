@@ -0,0 +1,147 @@
+import os
+import sys
+import threading
+import pytest
+from ultron_cli import rollout, transport, watch
+from ultron_cli.rollout import Rollout, plan
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import mockserver  # noqa: E402
+
+
+NAMES = ['host{}'.format(i) for i in range(10)]
+
+
+def test_plan_waves():
+    assert plan(NAMES, 4) == [NAMES[:4], NAMES[4:8], NAMES[8:]]
+    assert plan(NAMES, 5) == [NAMES[:5], NAMES[5:]]
+    assert plan(NAMES, 20) == [NAMES]
+    assert plan(NAMES) == [NAMES]
+    assert plan([], 4) == []
+
+
+def test_plan_canary():
+    assert plan(NAMES, 4, canary=1) == [NAMES[:1], NAMES[1:5], NAMES[5:9], NAMES[9:]]
+    assert plan(NAMES, canary=3) == [NAMES[:3], NAMES[3:]]
+    assert plan(NAMES, 4, canary=10) == [NAMES]
+    assert plan(NAMES, 4, canary=20) == [NAMES]
+
+
+class Submit(object):
+    "Fails the given clients, records the waves submitted"
+
+    def __init__(self, failing=(), raising=()):
+        self.failing = set(failing)
+        self.raising = set(raising)
+        self.waves = []
+
+    def __call__(self, wave):
+        self.waves.append(wave)
+        if self.raising & set(wave):
+            raise RuntimeError('ERROR: 500')
+        return len(self.failing & set(wave))
+
+
+def canary_rollout(run, waves):
+    "Like clients.Perform.roll_out, the rest only runs after a good canary"
+    if run.run(waves[:1]):
+        run.run(waves[1:])
+
+
+def test_rollout_all_waves():
+    submit = Submit(failing=['host3'])
+    run = Rollout(submit, max_failure_ratio=0.5)
+    assert run.run(plan(NAMES, 4))
+    assert submit.waves == plan(NAMES, 4)
+    assert (run.done, run.failed, run.stopped) == (10, 1, False)
+
+
+def test_rollout_failed_canary():
+    submit = Submit(failing=['host0'])
+    run = Rollout(submit, max_failure_ratio=0.1)
+    canary_rollout(run, plan(NAMES, 4, canary=1))
+    assert submit.waves == [['host0']]
+    assert (run.done, run.failed, run.stopped) == (1, 1, True)
+
+
+def test_rollout_good_canary():
+    submit = Submit(failing=['host9'])
+    run = Rollout(submit, max_failure_ratio=0.1)
+    canary_rollout(run, plan(NAMES, 4, canary=1))
+    assert len(submit.waves) == 4
+    assert (run.done, run.failed, run.stopped) == (10, 1, False)
+
+
+def test_rollout_stops_over_max_failure_ratio():
+    submit = Submit(failing=['host2', 'host3'])
+    run = Rollout(submit, max_failure_ratio=0.25)
+    assert not run.run(plan(NAMES, 2))
+    # 1 of 4 done clients failed is within the ratio, 2 of 4 is not
+    assert submit.waves == [NAMES[0:2], NAMES[2:4]]
+    assert (run.done, run.failed) == (4, 2)
+
+
+def test_rollout_raising_wave_counts_whole_wave():
+    submit = Submit(raising=['host4'])
+    run = Rollout(submit, max_failure_ratio=0.5)
+    assert run.run(plan(NAMES, 4))
+    assert (run.done, run.failed) == (10, 4)
+
+
+def test_rollout_concurrent_waves_finish():
+    release = threading.Event()
+    submit = Submit(failing=NAMES)
+
+    def slow(wave):
+        failed = submit(wave)
+        if wave[0] != 'host0':
+            release.wait(5)
+        else:
+            release.set()
+        return failed
+
+    run = Rollout(slow, concurrency=2, max_failure_ratio=0.1)
+    assert not run.run(plan(NAMES, 2))
+    # The wave in flight when the first one failed still counts
+    assert len(submit.waves) == 2
+    assert (run.done, run.failed) == (4, 4)
+
+
+class Session(object):
+    certfile = False
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = mockserver.serve(0, 10)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:{}/api/v1.0/clients/admin/test'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def names(server):
+    return sorted(transport.get(server, params={'fields': 'name'}).json()['result'].keys())
+
+
+def test_watch_finished_and_missing_clients(server):
+    done = names(server)[:2]
+    assert transport.post(server, data={'task': 'wtest', 'clientnames': ','.join(done)}).status_code == 200
+    watcher = watch.Watcher(Session(), server, 'wtest', done + ['gone'], interval=0.01)
+    assert watcher.run() == 1
+    assert (watcher.success, watcher.failed, watcher.pending) == (2, 1, set())
+
+
+def test_watch_times_out_on_pending_clients(server):
+    pending = names(server)[2:4]
+    data = {'task': 'wtest', 'async': '1', 'clientnames': ','.join(pending)}
+    assert transport.post(server, data=data).status_code == 200
+    watcher = watch.Watcher(Session(), server, 'wtest', pending, interval=0.01, timeout=0.05)
+    assert watcher.run() == 2
+    assert watcher.pending == set(pending)
+
+
+def test_chunks():
+    assert list(rollout.chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,54 @@
+import random
+from collections import Counter, OrderedDict
+from ultron_cli import sketch
+
+
+def test_hyperloglog_small_counts():
+    hll = sketch.HyperLogLog()
+    assert hll.estimate() == 0
+    for x in ['a', 'b', 'c', 'a', 'b', 'a']:
+        hll.add(x)
+    assert hll.estimate() == 3
+
+
+def test_hyperloglog_error_bound():
+    hll = sketch.HyperLogLog(precision=12)
+    for i in range(100000):
+        hll.add('host{}'.format(i % 50000))
+    # 1.04/sqrt(4096) is about 1.6%, allow three standard errors
+    assert abs(hll.estimate() - 50000) < 50000 * 0.05
+
+
+def test_hyperloglog_mixed_types():
+    hll = sketch.HyperLogLog()
+    for x in [1, '1', 1.5, True, None, 'x']:
+        hll.add(x)
+    assert hll.estimate() >= 5
+
+
+def test_space_saving_exact_under_capacity():
+    counter = sketch.SpaceSaving(10)
+    for x in 'aaabbc':
+        counter.add(x)
+    assert counter.top(2) == OrderedDict([('a', 3), ('b', 2)])
+
+
+def test_space_saving_heavy_hitters():
+    rand = random.Random(7)
+    values = ['hot'] * 3000 + ['warm'] * 1500 + ['cold{}'.format(rand.randrange(5000)) for _ in range(5000)]
+    rand.shuffle(values)
+    counter = sketch.SpaceSaving(100)
+    for x in values:
+        counter.add(x)
+    top = counter.top(2)
+    assert list(top.keys()) == ['hot', 'warm']
+    truth = Counter(values)
+    # Counts are overestimated by at most n/capacity
+    for k, v in top.items():
+        assert truth[k] <= v <= truth[k] + len(values) // 100
+
+
+def test_summary():
+    assert sketch.summary(12, OrderedDict([('a', 5), ('b', 3)]), approximate=True) == '~12 distinct; top: a=5, b=3'
+    assert sketch.summary(2, OrderedDict([(True, 1), (None, 1)])) == '2 distinct; top: True=1, None=1'
+    assert sketch.summary(0, OrderedDict()) == '0 distinct'
@@ -0,0 +1,70 @@
+import json
+import pytest
+from ultron_cli import stream
+
+
+class Response(object):
+    "Streamed response serving body in chunks of size bytes"
+
+    def __init__(self, body, size):
+        self.body = body.encode('utf-8') if not isinstance(body, bytes) else body
+        self.size = size
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), self.size):
+            yield self.body[i:i+self.size]
+
+    def close(self):
+        self.closed = True
+
+
+RESULT = {
+    'host1': {'name': 'host1', 'props': {'quote': 'say "hi"\\n', 'path': 'C:\\\\tmp'}, 'groups': ['web']},
+    'hôst2': {'name': 'hôst2', 'props': {'city': 'Zürich', 'emoji': '\U0001f600', 'cjk': '日本'}},
+    'host3': {'name': 'host3', 'state': {'load': 12.5, 'exp': -1.5e-3, 'big': 1234567890123, 'zero': 0},
+              'tasks': {}, 'up': True, 'down': False, 'none': None},
+    'esc\\u00e9': {'name': 'tab\there', 'unicode': '\u00e9\u2603'},
+}
+
+
+def parse(body, size):
+    response = Response(body, size)
+    result = list(stream.iter_result(response))
+    assert response.closed
+    return result
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 64, 100000])
+def test_chunk_boundaries(size):
+    body = json.dumps({'message': 'ok', 'result': RESULT}, ensure_ascii=False)
+    assert parse(body, size) == list(RESULT.items())
+
+
+@pytest.mark.parametrize('size', [1, 3, 64])
+def test_ascii_escapes_and_whitespace(size):
+    body = json.dumps({'result': RESULT, 'other': [1, {'result': 2}]}, indent=4, ensure_ascii=True)
+    assert parse(body, size) == list(RESULT.items())
+
+
+@pytest.mark.parametrize('size', [1, 2, 4])
+def test_numbers_split_across_chunks(size):
+    body = '{"result": {"a": 12345, "b": -6.25e+10, "c": 0.5, "d": 1E3, "e": 7}}'
+    assert parse(body, size) == [('a', 12345), ('b', -6.25e+10), ('c', 0.5), ('d', 1000.0), ('e', 7)]
+
+
+@pytest.mark.parametrize('body', ['{"result": {}}', '{}', '{"message": "none", "count": 0}', ' { } '])
+def test_empty_or_missing_result(body):
+    assert parse(body, 1) == []
+
+
+def test_other_key():
+    assert parse('{"result": {"a": 1}, "groups": {"g": 2}}', 3) == [('a', 1)]
+    response = Response('{"result": {"a": 1}, "groups": {"g": 2}}', 3)
+    assert list(stream.iter_result(response, key='groups')) == [('g', 2)]
+
+
+@pytest.mark.parametrize('body', ['', '{"result": {"a": 1', '{"result": {"a" 1}}', '[1, 2]'])
+def test_malformed(body):
+    with pytest.raises(ValueError):
+        parse(body, 2)
@@ -0,0 +1,34 @@
+from ultron_cli.trie import Trie
+
+
+def test_membership_and_size():
+    t = Trie(['web1', 'web10', 'web1', 'db'])
+    assert len(t) == 3
+    assert 'web1' in t and 'web10' in t and 'db' in t
+    assert 'web' not in t and 'web100' not in t and '' not in t
+
+
+def test_complete_sorted():
+    words = ['web10', 'web2', 'web1', 'db1', 'web', 'wexx', 'x']
+    t = Trie(words)
+    assert t.complete('we') == ['web', 'web1', 'web10', 'web2', 'wexx']
+    assert t.complete('') == sorted(words)
+    assert t.complete('web1') == ['web1', 'web10']
+
+
+def test_complete_limit():
+    t = Trie('host{:03d}'.format(i) for i in range(500))
+    assert t.complete('host', limit=3) == ['host000', 'host001', 'host002']
+    assert t.complete('host49', limit=100) == ['host49{}'.format(i) for i in range(10)]
+
+
+def test_complete_missing_prefix():
+    t = Trie(['a'])
+    assert t.complete('b') == []
+    assert Trie().complete('') == []
+
+
+def test_unicode():
+    t = Trie(['hôst', 'höst', 'host'])
+    assert t.complete('h') == sorted(['hôst', 'höst', 'host'])
+    assert 'hôst' in t
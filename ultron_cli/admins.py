@@ -1,15 +1,10 @@
-import os
 import json
 import logging
 import requests
-from attrdict import AttrDict
 from cliff.lister import Lister
 from cliff.command import Command
 from cliff.show import ShowOne
-from prompt_toolkit import prompt
-
-
-sessionfile = os.path.expanduser('~/.ultron_session.json')
+from ultron_cli import transport, nameindex, context
 
 
 class List(Lister):
@@ -18,11 +13,11 @@ class List(Lister):
     log = logging.getLogger(__name__)
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         url = '{}/admins'.format(session.endpoint)
-        result = requests.get(url, params={'fields': 'name'}, verify=session.certfile,
-                              auth=(session.username, session.password))
+        result = transport.get(url, params={'fields': 'name'}, verify=session.certfile,
+                               auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             admins = result.json().get('result', {})
@@ -47,7 +42,7 @@ class Show(ShowOne):
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         params = {}
         if len(p.fields) > 0:
@@ -56,8 +51,8 @@ class Show(ShowOne):
             params['dynfields'] = ','.join(p.dynfields)
 
         url = '{}/admins/{}'.format(session.endpoint, p.admin)
-        result = requests.get(url, params=params, verify=session.certfile,
-                              auth=(session.username, session.password))
+        result = transport.get(url, params=params, verify=session.certfile,
+                               auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             admin = result.json().get('result',{}).get(p.admin)
@@ -77,12 +72,14 @@ class New(Command):
         parser.add_argument('admins', nargs='*')
         parser.add_argument('-p', '--password', default=None)
         parser.add_argument('-P', '--props', nargs='*', default=[])
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         if len(p.admins) == 0:
+            from prompt_toolkit import prompt
             adminnames = prompt('Enter usernames and press ESC+ENTER\n> ', multiline=True).split()
         else:
             adminnames = p.admins
@@ -102,17 +99,19 @@ class New(Command):
 
         url = '{}/admins'.format(session.endpoint)
 
+        index = nameindex.NameIndex(session, 'admins', trust=p.trust_cache)
+
         # Validate if already exists
-        result = requests.get(url, params={'adminnames': data['adminnames'], 'fields': 'name'},
-                              verify=session.certfile, auth=(session.username, session.password))
-        admins = result.json().get('result')
-        if len(admins) > 0:
-            raise RuntimeError('ERROR: Duplicate admins: {}'.format(', '.join(admins.keys())))
+        if not p.no_validate:
+            admins = index.existing(adminnames)
+            if len(admins) > 0:
+                raise RuntimeError('ERROR: Duplicate admins: {}'.format(', '.join(admins)))
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.post(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
+            index.add(adminnames)
             print('SUCCESS: Created new admins')
             return
         raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
@@ -128,10 +127,11 @@ class Update(Command):
         parser.add_argument('admins', nargs='*', default=[])
         parser.add_argument('-p', '--password', default=None)
         parser.add_argument('-P', '--props', nargs='*', default=[])
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         data = {}
         if len(p.admins) > 0:
@@ -148,16 +148,16 @@ class Update(Command):
 
         url = '{}/admins'.format(session.endpoint)
 
+        index = nameindex.NameIndex(session, 'admins', trust=p.trust_cache)
+
         # Validate no extra admins
-        if len(p.admins) > 0:
-            result = requests.get(url, params={'adminnames': data['adminnames'], 'fields': 'name'},
-                                  verify=session.certfile, auth=(session.username, session.password))
-            admins = result.json().get('result')
-            if len(admins) != len(p.admins):
-                raise RuntimeError('ERROR: admins not found: {}'.format(', '.join(set(set(p.admins)-admins.keys()))))
+        if len(p.admins) > 0 and not p.no_validate:
+            missing = index.missing(p.admins)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: admins not found: {}'.format(', '.join(missing)))
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.post(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             print('SUCCESS: Updated admins')
@@ -173,10 +173,11 @@ class Delete(Command):
     def get_parser(self, prog_name):
         parser = super(Delete, self).get_parser(prog_name)
         parser.add_argument('admins', nargs='*', default=[])
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         data = {}
         if len(p.admins) > 0:
@@ -184,18 +185,22 @@ class Delete(Command):
 
         url = '{}/admins'.format(session.endpoint)
 
+        index = nameindex.NameIndex(session, 'admins', trust=p.trust_cache)
+
         # Validate no extra admins
-        if len(p.admins) > 0:
-            result = requests.get(url, params={'adminnames': data['adminnames'], 'fields': 'name'},
-                                  verify=session.certfile, auth=(session.username, session.password))
-            admins = result.json().get('result')
-            if len(admins) != len(p.admins):
-                raise RuntimeError('ERROR: admins not found: {}'.format(', '.join(set(set(p.admins)-admins.keys()))))
+        if len(p.admins) > 0 and not p.no_validate:
+            missing = index.missing(p.admins)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: admins not found: {}'.format(', '.join(missing)))
 
-        result = requests.delete(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.delete(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
+            if len(p.admins) > 0:
+                index.remove(p.admins)
+            else:
+                index.clear()
             print('SUCCESS: Deleted admins')
             return
         raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
@@ -207,20 +212,20 @@ class ListTasks(Lister):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         parser = super(ListTasks, self).get_parser(prog_name)
         parser.add_argument('-A', '--admin', default=session.username)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         params = {'dynfields': 'allowed_tasks', 'fields': 'name'}
 
         url = '{}/admins/{}'.format(session.endpoint, p.admin)
-        result = requests.get(url, params=params, verify=session.certfile,
-                              auth=(session.username, session.password))
+        result = transport.get(url, params=params, verify=session.certfile,
+                               auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             admin = result.json().get('result',{}).get(p.admin)
@@ -239,20 +244,20 @@ class ListInventories(Lister):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         parser = super(ListInventories, self).get_parser(prog_name)
         parser.add_argument('-A', '--admin', default=session.username)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
 
         params = {'dynfields': 'inventories', 'fields': 'name'}
 
         url = '{}/admins/{}'.format(session.endpoint, p.admin)
-        result = requests.get(url, params=params, verify=session.certfile,
-                              auth=(session.username, session.password))
+        result = transport.get(url, params=params, verify=session.certfile,
+                               auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             admin = result.json().get('result',{}).get(p.admin)
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from ultron_cli import sketch, trace
+
+
+class TaskStats(object):
+    "Count clients per task status"
+
+    fields = ('tasks',)
+
+    def __init__(self, names=()):
+        self.names = names
+        self.tasks = OrderedDict()
+
+    def add(self, client):
+        for k, status in client.tasks.items():
+            if len(self.names) > 0 and k not in self.names: continue
+            if k not in self.tasks:
+                self.tasks[k] = {
+                    'performed on': 0, 'success': 0,
+                    'failed': 0, 'pending': 0
+                }
+            self.tasks[k]['performed on'] += 1
+            self.tasks[k][status.lower()] += 1
+
+    def result(self):
+        return self.tasks
+
+
+class Histogram(object):
+    "Count clients per value of every key in a client field"
+
+    field = None
+
+    # Keys with more distinct values than this are left out of the result
+    limit = 15
+
+    @property
+    def fields(self):
+        return (self.field,)
+
+    def __init__(self, names=()):
+        self.names = names
+        self.counts = OrderedDict()
+
+    def add(self, client):
+        for k, v in getattr(client, self.field).items():
+            if len(self.names) > 0 and k not in self.names: continue
+            if k not in self.counts: self.counts[k] = {}
+            if v not in self.counts[k]: self.counts[k][v] = 0
+            self.counts[k][v] += 1
+
+    def result(self):
+        return OrderedDict((k, v) for k, v in self.counts.items() if len(v) <= self.limit)
+
+
+class StateStats(Histogram):
+    "Count clients per value of every state"
+
+    field = 'state'
+
+
+class PropStats(Histogram):
+    "Count clients per value of every prop"
+
+    field = 'props'
+
+
+class Sketch(object):
+    """Estimate distinct values and the most common ones of every key in a client field.
+
+    Memory per key is fixed, so high-cardinality keys are summarized
+    instead of being left out like in Histogram.
+    """
+
+    field = None
+
+    def __init__(self, names=(), top=10):
+        self.names = names
+        self.top = top
+        self.sketches = OrderedDict()
+
+    @property
+    def fields(self):
+        return (self.field,)
+
+    def add(self, client):
+        for k, v in getattr(client, self.field).items():
+            if len(self.names) > 0 and k not in self.names: continue
+            if k not in self.sketches:
+                self.sketches[k] = (sketch.HyperLogLog(), sketch.SpaceSaving(max(self.top * 4, 100)))
+            distinct, frequent = self.sketches[k]
+            distinct.add(v)
+            frequent.add(v)
+
+    def result(self):
+        return OrderedDict((k, sketch.summary(d.estimate(), f.top(self.top), approximate=True))
+                           for k, (d, f) in self.sketches.items())
+
+
+class StateSketch(Sketch):
+    "Estimate distinct and most common values of every state"
+
+    field = 'state'
+
+
+class PropSketch(Sketch):
+    "Estimate distinct and most common values of every prop"
+
+    field = 'props'
+
+
+DIMENSIONS = OrderedDict([
+    ('tasks', TaskStats),
+    ('states', StateStats),
+    ('props', PropStats)
+])
+
+SKETCHES = OrderedDict([
+    ('states', StateSketch),
+    ('props', PropSketch)
+])
+
+
+@trace.traced('aggregate')
+def aggregate(clients, stats):
+    "Feed every client to all stats in a single pass"
+    for client in clients:
+        for s in stats:
+            s.add(client)
+    return stats
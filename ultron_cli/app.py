@@ -0,0 +1,88 @@
+import os
+import time
+import importlib
+from cliff.app import App
+from cliff.commandmanager import CommandManager
+from ultron_cli.config import VERSION
+from ultron_cli.commands import COMMANDS
+from ultron_cli import context, trace
+
+
+class LazyEntryPoint(object):
+    "Entry point importing its command module only when the command is run"
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def load(self):
+        module, attr = self.value.split(':')
+        return getattr(importlib.import_module(module), attr)
+
+
+class LazyCommandManager(CommandManager):
+    "Command manager reading the command manifest instead of entry points"
+
+    def load_commands(self, namespace):
+        if namespace != 'ultron.cli':
+            return super(LazyCommandManager, self).load_commands(namespace)
+        self.group_list.append(namespace)
+        for name, value in COMMANDS:
+            self.commands[name] = LazyEntryPoint(name, value)
+
+
+class UltronCli(App):
+    "Command-line interface to interact with Ultron API"
+    def __init__(self, stdin=None, stdout=None, stderr=None):
+        super(UltronCli, self).__init__(
+            description='Command-line interface to interact with Ultron API',
+            version=VERSION,
+            command_manager=LazyCommandManager('ultron.cli'),
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            deferred_help=True,
+            )
+
+    def build_option_parser(self, description, version, argparse_kwargs=None):
+        parser = super(UltronCli, self).build_option_parser(description, version, argparse_kwargs)
+        parser.add_argument('--profile', default=os.environ.get('ULTRON_PROFILE') or None,
+                            help='Session profile to use, see "list profiles" (Env: ULTRON_PROFILE)')
+        parser.add_argument('--trace', action='store_true',
+                            help='Print where the time of each command went: HTTP calls, decoding and compute')
+        parser.add_argument('--trace-file', default=None,
+                            help='With --trace, also write the spans as Chrome trace-event JSON to this file')
+        return parser
+
+    def initialize_app(self, argv):
+        self.LOG.debug('initialize_app')
+        context.context.profile = self.options.profile
+        trace.enable(self.options.trace or self.options.trace_file is not None)
+        # Start times of the running commands by id, batch runs commands inside a command, maybe on threads
+        self.started = {}
+
+    def interact(self):
+        # cmd2 is a slow import, only interactive mode needs it
+        from ultron_cli.shell import Shell
+        self.interactive_app_factory = Shell
+        super(UltronCli, self).interact()
+
+    def prepare_to_run_command(self, cmd):
+        self.LOG.debug('prepare_to_run_command %s', cmd.__class__.__name__)
+        self.started[id(cmd)] = time.time()
+
+    def clean_up(self, cmd, result, err):
+        self.LOG.debug('clean_up %s', cmd.__class__.__name__)
+        if err:
+            self.LOG.debug('got an error: %s', err)
+        start = self.started.pop(id(cmd))
+        if trace.tracer is None:
+            return
+        name = getattr(cmd, 'cmd_name', None) or cmd.__class__.__name__
+        trace.tracer.add('command {}'.format(name), 'command', start, time.time() - start)
+        if len(self.started) == 0:
+            trace.tracer.render(self.stderr)
+            if self.options.trace_file:
+                trace.tracer.write(self.options.trace_file)
+            trace.tracer.reset()
+
@@ -0,0 +1,123 @@
+import io
+import sys
+import time
+import shlex
+import logging
+import threading
+from cliff.command import Command
+from ultron_cli import rollout
+
+
+class Output(object):
+    "Stream writing to the buffer of the current thread when it captures output"
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def capture(self):
+        self.local.buffer = io.StringIO()
+
+    def release(self):
+        buffer, self.local.buffer = self.local.buffer, None
+        return buffer.getvalue()
+
+
+def parse(lines):
+    "Blocks of (line number, command line), split on blank lines, without comments"
+    blocks, block = [], []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            if block:
+                blocks.append(block)
+                block = []
+        elif not line.startswith('#'):
+            block.append((number, line))
+    if block:
+        blocks.append(block)
+    return blocks
+
+
+class Batch(Command):
+    "Run command lines from a script or stdin in one process"
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(Batch, self).get_parser(prog_name)
+        parser.add_argument('script', nargs='?', default='-', help='Script file, stdin by default')
+        parser.add_argument('-P', '--parallel', type=int, default=1,
+                            help='Lines of a block (separated by blank lines) run at the same time')
+        parser.add_argument('-x', '--stop-on-error', action='store_true', help='Stop after the first failed line, or parallel block')
+        return parser
+
+    def run_line(self, line, out, capture):
+        if capture:
+            out.capture()
+        start = time.time()
+        try:
+            code = self.app.run_subcommand(shlex.split(line))
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception as e:
+            self.log.error(e)
+            code = 1
+        output = out.release() if capture else ''
+        return code or 0, time.time() - start, output
+
+    def report(self, stream, number, line, result):
+        code, elapsed, output = result
+        stream.write(output)
+        stream.flush()
+        status = 'ok' if code == 0 else 'FAILED({})'.format(code)
+        self.app.stderr.write('{:10} {:8.3f}s  {}: {}\n'.format(status, elapsed, number, line))
+        return code == 0
+
+    def take_action(self, p):
+        if p.script == '-':
+            blocks = parse(sys.stdin.read().splitlines())
+        else:
+            with open(p.script) as f:
+                blocks = parse(f)
+
+        stream, saved = self.app.stdout, sys.stdout
+        out = Output(stream)
+        sys.stdout = self.app.stdout = out
+        start, ran, failed = time.time(), 0, 0
+        try:
+            for block in blocks:
+                if p.parallel > 1 and len(block) > 1:
+                    results = {}
+                    for item, future in rollout.parallel(lambda x: self.run_line(x[1], out, True), block, p.parallel):
+                        results[item] = future.result()
+                    # Reported in script order, with each line's output kept together
+                    ok = [self.report(stream, n, line, results[(n, line)]) for n, line in block]
+                else:
+                    ok = []
+                    for n, line in block:
+                        ok.append(self.report(stream, n, line, self.run_line(line, out, False)))
+                        # Sequential lines stop right at the failure, parallel blocks once finished
+                        if not ok[-1] and p.stop_on_error:
+                            break
+                ran += len(ok)
+                failed += ok.count(False)
+                if failed > 0 and p.stop_on_error:
+                    break
+        finally:
+            sys.stdout, self.app.stdout = saved, stream
+
+        if failed > 0:
+            raise RuntimeError('ERROR: {} of {} lines failed'.format(failed, ran))
+        print('SUCCESS: Ran {} lines in {:.2f}s'.format(ran, time.time() - start))
@@ -0,0 +1,225 @@
+import time
+import random
+import logging
+import threading
+import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cliff.lister import Lister
+from ultron_cli import transport, stream, clients, groups, context
+from ultron_cli.config import POOL_SIZE
+
+
+# Operations of a mix, reads and task submissions built like the commands doing them
+OPERATIONS = ('list', 'show', 'groups', 'perform', 'perform-group')
+
+
+def parse_mix(text):
+    "Weights of operations from op=weight,... pairs"
+    mix = OrderedDict()
+    for pair in text.split(','):
+        name, _, weight = pair.partition('=')
+        if name not in OPERATIONS:
+            raise RuntimeError('ERROR: Unknown operation {}, choose from: {}'.format(name, ', '.join(OPERATIONS)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    "Nearest rank percentile of sorted values"
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def check(result):
+    if result.status_code != requests.codes.ok:
+        raise RuntimeError('ERROR: {}'.format(result.status_code))
+    return result
+
+
+class Load(object):
+    """Call operations closed loop from concurrency workers, or open loop at rate calls per second.
+
+    Open loop latency counts from when a call was scheduled, so the time
+    calls wait for a free worker of a saturated API is included.
+    """
+
+    def __init__(self, pick, concurrency, duration, count=0, rate=0):
+        self.pick = pick
+        self.concurrency = max(concurrency, 1)
+        self.duration = duration
+        self.rate = rate
+        self.count = count or (int(rate * duration) if rate > 0 else 0)
+        self.issued = 0
+        self.results = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.started = self.elapsed = 0
+
+    def take(self):
+        "Sequence number of the next call, None when the run is over"
+        with self.lock:
+            if self.stopped.is_set() or (self.count > 0 and self.issued >= self.count):
+                return None
+            if self.count == 0 and time.time() - self.started >= self.duration:
+                return None
+            self.issued += 1
+            return self.issued - 1
+
+    def call(self, scheduled):
+        name, fn = self.pick()
+        error = None
+        try:
+            fn()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        self.results.append((name, time.time() - scheduled, error))
+
+    def worker(self):
+        while self.take() is not None:
+            self.call(time.time())
+
+    def run(self):
+        self.started = time.time()
+        try:
+            if self.rate > 0:
+                self.run_open()
+            else:
+                self.run_closed()
+        except KeyboardInterrupt:
+            self.stopped.set()
+        self.elapsed = time.time() - self.started
+        return self.results
+
+    def run_closed(self):
+        workers = [threading.Thread(target=self.worker) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            # Joined with a timeout so Ctrl-C stops the run
+            while worker.is_alive():
+                worker.join(0.1)
+
+    def run_open(self):
+        queued = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            try:
+                i = self.take()
+                while i is not None:
+                    scheduled = self.started + i / self.rate
+                    if scheduled > time.time():
+                        self.stopped.wait(scheduled - time.time())
+                    future = pool.submit(self.call, scheduled)
+                    queued.add(future)
+                    future.add_done_callback(queued.discard)
+                    i = self.take()
+            except KeyboardInterrupt:
+                # Calls still waiting for a worker are dropped, running ones finish
+                self.stopped.set()
+                for future in list(queued):
+                    future.cancel()
+                raise
+
+
+class Bench(Lister):
+    "Generate load on the API with a mix of reads and task submissions"
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        session = context.session()
+        parser = super(Bench, self).get_parser(prog_name)
+        parser.add_argument('-A', '--admin', default=session.username)
+        parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-m', '--mix', default='show=8,list=1,groups=1',
+                            help='Weighted operations, from: {}'.format(', '.join(OPERATIONS)))
+        parser.add_argument('--concurrency', type=int, default=4, help='Calls in flight at most')
+        parser.add_argument('-r', '--rate', type=float, default=0,
+                            help='Open loop calls per second, closed loop when 0')
+        parser.add_argument('-d', '--duration', type=float, default=10, help='Seconds to run')
+        parser.add_argument('-n', '--requests', type=int, default=0, help='Calls to make, instead of a duration')
+        parser.add_argument('-T', '--task', default=None, help='Task submitted by perform operations')
+        parser.add_argument('--task-clients', type=int, default=1, help='Clients a perform call targets')
+        parser.add_argument('-S', '--synchronous', action='store_true', help='Submit tasks synchronously')
+        parser.add_argument('--seed', type=int, default=None)
+        return parser
+
+    def operations(self, session, p, names, groupnames, rand):
+        "Map of operation name to a function making one call of it"
+
+        def list_clients():
+            method, url, kwargs = clients.list_request(session, p.admin, p.inventory)
+            for _ in stream.iter_result(check(transport.request(method, url, stream=True, **kwargs))):
+                pass
+
+        def show_client():
+            method, url, kwargs = clients.show_request(session, p.admin, p.inventory, rand.choice(names))
+            check(transport.request(method, url, **kwargs)).json()
+
+        def list_groups():
+            method, url, kwargs = groups.list_request(session, p.admin, p.inventory)
+            check(transport.request(method, url, **kwargs)).json()
+
+        def perform():
+            targets = rand.sample(names, min(p.task_clients, len(names)))
+            method, url, kwargs = clients.perform_request(session, p.admin, p.inventory, p.task, targets,
+                                                          p.synchronous)
+            check(transport.request(method, url, **kwargs))
+
+        def perform_group():
+            method, url, kwargs = groups.perform_request(session, p.admin, p.inventory, rand.choice(groupnames),
+                                                         p.task, p.synchronous)
+            check(transport.request(method, url, **kwargs))
+
+        return {'list': list_clients, 'show': show_client, 'groups': list_groups,
+                'perform': perform, 'perform-group': perform_group}
+
+    def take_action(self, p):
+        session = context.session()
+        mix = parse_mix(p.mix)
+        if p.task is None and ('perform' in mix or 'perform-group' in mix):
+            raise RuntimeError('ERROR: --task is required for perform operations')
+        if p.concurrency > POOL_SIZE:
+            self.log.warning('Concurrency above the connection pool size, set ULTRON_POOL_SIZE={}'.format(
+                p.concurrency))
+
+        # Targets are listed once up front, outside the measured calls
+        method, url, kwargs = clients.list_request(session, p.admin, p.inventory, ('name',))
+        names = [k for k, _ in stream.iter_result(check(transport.request(method, url, stream=True, **kwargs)))]
+        method, url, kwargs = groups.list_request(session, p.admin, p.inventory)
+        groupnames = list(check(transport.request(method, url, **kwargs)).json().get('result', {}).keys())
+        if len(names) == 0 and ('show' in mix or 'perform' in mix):
+            raise RuntimeError('ERROR: Clients not found')
+        if len(groupnames) == 0 and 'perform-group' in mix:
+            raise RuntimeError('ERROR: Groups not found')
+
+        rand = random.Random(p.seed)
+        calls = self.operations(session, p, names, groupnames, rand)
+        choices, weights = list(mix.keys()), list(mix.values())
+
+        def pick():
+            name = rand.choices(choices, weights)[0]
+            return name, calls[name]
+
+        load = Load(pick, p.concurrency, p.duration, p.requests, p.rate)
+        results = load.run()
+
+        errors = {}
+        for _, _, error in results:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+        for error, count in sorted(errors.items(), key=lambda x: -x[1]):
+            self.log.warning('{} calls failed: {}'.format(count, error))
+
+        cols = ['operation', 'calls', 'errors', 'error %', 'calls/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms']
+        rows = []
+        for name in choices + ['total']:
+            done = results if name == 'total' else [x for x in results if x[0] == name]
+            latencies = sorted(x[1] * 1000 for x in done)
+            failed = sum(1 for x in done if x[2] is not None)
+            rows.append([name, len(done), failed, round(100.0 * failed / len(done), 2) if done else 0.0,
+                         round(len(done) / load.elapsed, 1) if load.elapsed > 0 else 0.0]
+                        + [round(percentile(latencies, x), 1) for x in (50, 90, 99, 100)])
+        return [cols, rows]
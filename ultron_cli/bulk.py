@@ -0,0 +1,119 @@
+import os
+import csv
+import json
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+log = logging.getLogger(__name__)
+
+FORMATS = ['auto', 'plain', 'csv', 'jsonl']
+
+
+def detect_format(path):
+    ext = os.path.splitext(path or '')[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    return 'plain'
+
+
+def parse_props(pairs):
+    "Props dict from a list of key=value strings"
+    try:
+        return {x.split('=')[0]: '='.join(x.split('=')[1:]) for x in pairs}
+    except:
+        raise RuntimeError('ERROR: Invalid props format. Example format: a=123 b=abc c=xyz')
+
+
+def open_source(path, stdin):
+    "File object to read client records from, stdin when path is '-' or not given"
+    if path and path != '-':
+        return open(path)
+    return stdin
+
+
+def read_clients(lines, fmt='plain'):
+    """Yield (name, props) pairs from an iterable of lines.
+
+    plain: whitespace separated hostnames, no props
+    csv: a header row with a 'name' column, other columns are props
+    jsonl: one object per line, either {"name": ..., "props": {...}}
+    or a flat object whose other keys are props
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        if reader.fieldnames is not None and 'name' not in reader.fieldnames:
+            raise RuntimeError('ERROR: line 1: header has no name column')
+        for row in reader:
+            name = (row.pop('name', None) or '').strip()
+            if not name: continue
+            yield name, {k: v for k, v in row.items() if k and v not in (None, '')}
+    elif fmt == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line: continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise RuntimeError('ERROR: line {}: invalid JSON'.format(number))
+            if not isinstance(record, dict) or not record.get('name'):
+                raise RuntimeError('ERROR: line {}: missing name'.format(number))
+            name = record.pop('name')
+            props = record.pop('props', record)
+            if not isinstance(props, dict):
+                raise RuntimeError('ERROR: line {}: props is not an object'.format(number))
+            yield name, props
+    else:
+        for line in lines:
+            for name in line.split():
+                yield name, {}
+
+
+def dedupe(records, window=100000):
+    "Drop repeated names among the last window names seen"
+    seen = OrderedDict()
+    for name, props in records:
+        if name in seen:
+            seen.move_to_end(name)
+            continue
+        seen[name] = None
+        if len(seen) > window:
+            seen.popitem(last=False)
+        yield name, props
+
+
+def chunked(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def group_by_props(records):
+    "Map of JSON encoded props to the names sharing exactly those props"
+    groups = OrderedDict()
+    for name, props in records:
+        groups.setdefault(json.dumps(props, sort_keys=True), []).append(name)
+    return groups
+
+
+def pipeline(chunks, check, apply, depth=2):
+    """Run check on upcoming chunks in the background while apply runs on the current one.
+
+    apply receives what check returned, in chunk order.
+    """
+    with ThreadPoolExecutor(max_workers=depth) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(check, chunk))
+            if len(pending) >= depth:
+                apply(pending.popleft().result())
+        while len(pending) > 0:
+            apply(pending.popleft().result())
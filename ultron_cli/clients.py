@@ -1,15 +1,54 @@
-import os
+import sys
 import json
 import logging
 import requests
-from attrdict import AttrDict
+from collections import OrderedDict
 from cliff.lister import Lister
 from cliff.command import Command
 from cliff.show import ShowOne
-from prompt_toolkit import prompt
-
-
-sessionfile = os.path.expanduser('~/.ultron_session.json')
+from ultron_cli import transport, snapshot, stream, aggregate, projection, columnar, records, rollout, watch, bulk, nameindex, context
+from ultron_cli.config import WAVE_TIMEOUT
+
+
+def iter_clients(result):
+    "Stream the client records of a listing response one at a time"
+    found = False
+    for _, client in stream.iter_result(result):
+        found = True
+        yield records.Client.from_dict(client)
+    if not found:
+        raise RuntimeError('ERROR: Clients not found')
+
+
+def list_request(session, admin, inventory, fields=('name', 'groups')):
+    "Method, url and arguments of a request listing the clients of an inventory"
+    url = '{}/clients/{}/{}'.format(session.endpoint, admin, inventory)
+    return 'GET', url, {'params': projection.plan(fields), 'verify': session.certfile,
+                        'auth': (session.username, session.password)}
+
+
+def show_request(session, admin, inventory, client, fields=(), dynfields=()):
+    "Method, url and arguments of a request getting one client"
+    params = {}
+    if len(fields) > 0:
+        params['fields'] = ','.join(fields)
+    if len(dynfields) > 0:
+        params['dynfields'] = ','.join(dynfields)
+    url = '{}/clients/{}/{}/{}'.format(session.endpoint, admin, inventory, client)
+    return 'GET', url, {'params': params, 'verify': session.certfile}
+
+
+def perform_request(session, admin, inventory, task, clients=(), synchronous=False, kwargs=None):
+    "Method, url and arguments of a request performing task on the named clients, or all of them"
+    data = {'async': int(not synchronous), 'task': task}
+    if len(clients) > 0:
+        data['clientnames'] = ','.join(set(clients))
+    if kwargs:
+        if not isinstance(kwargs, dict):
+            raise RuntimeError('kwargs: Must be BSON encoded key-value pairs')
+        data['kwargs'] = json.dumps(kwargs)
+    url = '{}/clients/{}/{}'.format(session.endpoint, admin, inventory)
+    return 'POST', url, {'data': data, 'verify': session.certfile, 'auth': (session.username, session.password)}
 
 
 class List(Lister):
@@ -17,25 +56,23 @@ class List(Lister):
 
     log = logging.getLogger(__name__)
 
+    fields = ('name', 'groups')
+
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(List, self).get_parser(prog_name)
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
-        url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
-        result = requests.get(url, params={'fields': 'name', 'dynfields': 'groups'},
-                verify=session.certfile, auth=(session.username, session.password))
+        session = context.session()
+        method, url, kwargs = list_request(session, p.admin, p.inventory, self.fields)
+        result = transport.request(method, url, stream=True, **kwargs)
 
         if result.status_code == requests.codes.ok:
-            clients = result.json().get('result', {})
-            if len(clients) == 0:
-                raise RuntimeError('ERROR: Clients not found')
             cols = ['name', 'groups']
-            rows = [[x['name'], ', '.join(x['groups'])] for x in clients.values()]
+            rows = ([x.name, ', '.join(x.groups)] for x in iter_clients(result))
             return [cols, rows]
         raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
@@ -46,7 +83,7 @@ class Show(ShowOne):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Show, self).get_parser(prog_name)
         parser.add_argument('client')
         parser.add_argument('-A', '--admin', default=session.username)
@@ -56,15 +93,9 @@ class Show(ShowOne):
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
-        params = {}
-        if len(p.fields) > 0:
-            params['fields'] = ','.join(p.fields)
-        if len(p.dynfields) > 0:
-            params['dynfields'] = ','.join(p.dynfields)
-
-        url = '{}/clients/{}/{}/{}'.format(session.endpoint, p.admin, p.inventory, p.client)
-        result = requests.get(url, params=params, verify=session.certfile)
+        session = context.session()
+        method, url, kwargs = show_request(session, p.admin, p.inventory, p.client, p.fields, p.dynfields)
+        result = transport.request(method, url, **kwargs)
 
         if result.status_code == requests.codes.ok:
             client = result.json().get('result',{}).get(p.client)
@@ -80,17 +111,27 @@ class New(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(New, self).get_parser(prog_name)
         parser.add_argument('clients', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
         parser.add_argument('-P', '--props', nargs='*', default=[])
+        parser.add_argument('--from-file', default=None, help='Read clients from a file, - for stdin')
+        parser.add_argument('--stdin', action='store_true', help='Read clients from stdin')
+        parser.add_argument('--format', choices=bulk.FORMATS, default='auto',
+                            help='Format of --from-file/--stdin input, by file extension by default')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Clients checked and created per request')
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+        if p.from_file or p.stdin:
+            return self.bulk_create(session, p)
+
         if len(p.clients) == 0:
+            from prompt_toolkit import prompt
             clientnames = prompt('Enter hostnames and press ESC+ENTER\n> ', multiline=True).split()
         else:
             clientnames = p.clients
@@ -106,21 +147,64 @@ class New(Command):
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
+        index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
+
         # Validate if already exists
-        result = requests.get(url, params={'clientnames': data['clientnames'], 'fields': 'name'},
-                              verify=session.certfile)
-        clients = result.json().get('result')
-        if len(clients) > 0:
-            raise RuntimeError('ERROR: Duplicate clients: {}'.format(', '.join(clients.keys())))
+        if not p.no_validate:
+            clients = index.existing(clientnames)
+            if len(clients) > 0:
+                raise RuntimeError('ERROR: Duplicate clients: {}'.format(', '.join(clients)))
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.post(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
+            index.add(clientnames)
             print('SUCCESS: Created new clients')
             return
         raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
+    def bulk_create(self, session, p):
+        common = bulk.parse_props(p.props)
+        fmt = bulk.detect_format(p.from_file) if p.format == 'auto' else p.format
+        url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
+        source = bulk.open_source(p.from_file, sys.stdin)
+        rows = bulk.dedupe(bulk.read_clients(source, fmt), max(100000, 4 * p.chunk_size))
+        index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
+        totals = {'created': 0, 'existing': 0}
+        created = []
+
+        def check(chunk):
+            if p.no_validate:
+                return chunk, 0
+            existing = index.existing(x[0] for x in chunk)
+            return [x for x in chunk if x[0] not in existing], len(existing)
+
+        def create(checked):
+            new, existing = checked
+            for props, names in bulk.group_by_props((k, dict(common, **v)) for k, v in new).items():
+                data = {'clientnames': ','.join(names)}
+                if props != '{}':
+                    data['props'] = props
+                result = transport.post(url, data=data, verify=session.certfile,
+                                        auth=(session.username, session.password))
+                if result.status_code != requests.codes.ok:
+                    raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+                created.extend(names)
+            totals['created'] += len(new)
+            totals['existing'] += existing
+            self.log.info('Created {} clients, skipped {} existing'.format(totals['created'], totals['existing']))
+
+        try:
+            bulk.pipeline(bulk.chunked(rows, p.chunk_size), check, create)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            index.add(created)
+        if totals['created'] + totals['existing'] == 0:
+            raise RuntimeError('ERROR: No clients read as {} from {}'.format(fmt, p.from_file or '-'))
+        print('SUCCESS: Created {} new clients, skipped {} existing'.format(totals['created'], totals['existing']))
+
 
 class Update(Command):
     "Update details of existing clients"
@@ -128,16 +212,25 @@ class Update(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Update, self).get_parser(prog_name)
         parser.add_argument('clients', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
         parser.add_argument('-P', '--props', nargs='*', default=[])
+        parser.add_argument('--from-file', default=None, help='Read per-client props from a file, - for stdin')
+        parser.add_argument('--format', choices=bulk.FORMATS, default='auto',
+                            help='Format of --from-file input, by file extension by default')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Clients updated per request')
+        parser.add_argument('--concurrency', type=int, default=4, help='Requests sent at the same time')
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+        if p.from_file:
+            return self.bulk_update(session, p)
+
         data = {}
         if len(p.clients) > 0:
             data = {'clientnames': ','.join(set(p.clients))}
@@ -151,22 +244,63 @@ class Update(Command):
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
+        index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
+
         # Validate no extra clients
-        if len(p.clients) > 0:
-            result = requests.get(url, params={'clientnames': data['clientnames'], 'fields': 'name'},
-                                  verify=session.certfile)
-            clients = result.json().get('result')
-            if len(clients) != len(p.clients):
-                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(set(set(p.clients)-clients.keys()))))
+        if len(p.clients) > 0 and not p.no_validate:
+            missing = index.missing(p.clients)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(missing)))
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.post(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             print('SUCCESS: Updated clients')
             return
         raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
+    def bulk_update(self, session, p):
+        common = bulk.parse_props(p.props)
+        fmt = bulk.detect_format(p.from_file) if p.format == 'auto' else p.format
+        url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
+        source = bulk.open_source(p.from_file, sys.stdin)
+        try:
+            # Later lines override earlier ones for the same client
+            clients = OrderedDict((k, dict(common, **v)) for k, v in bulk.read_clients(source, fmt))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        # Input not matching --format reads as no clients or clients without props
+        if len(clients) == 0:
+            raise RuntimeError('ERROR: No clients read as {} from {}'.format(fmt, p.from_file))
+        empty = [k for k, v in clients.items() if len(v) == 0]
+        if len(empty) > 0:
+            raise RuntimeError('ERROR: No props to apply to {} clients: {}'.format(
+                len(empty), ', '.join(empty[:10]) + (', ...' if len(empty) > 10 else '')))
+
+        if not p.no_validate:
+            index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
+            missing = index.missing(clients.keys())
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(sorted(missing))))
+
+        # One request per distinct props payload, split when too many clients share it
+        requests_data = [{'clientnames': ','.join(names), 'props': props}
+                         for props, group in bulk.group_by_props(clients.items()).items()
+                         for names in rollout.chunks(group, p.chunk_size)]
+
+        def update(data):
+            result = transport.post(url, data=data, verify=session.certfile,
+                                    auth=(session.username, session.password))
+            if result.status_code != requests.codes.ok:
+                raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+
+        for _, future in rollout.parallel(update, requests_data, p.concurrency):
+            future.result()
+        print('SUCCESS: Updated {} clients in {} requests'.format(len(clients), len(requests_data)))
+
 
 class Delete(Command):
     "Delete clients from inventory"
@@ -174,33 +308,38 @@ class Delete(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Delete, self).get_parser(prog_name)
         parser.add_argument('clients', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         data = {}
         if len(p.clients) > 0:
             data = {'clientnames': ','.join(set(p.clients))}
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
+        index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
+
         # Validate no extra clients
-        if len(p.clients) > 0:
-            result = requests.get(url, params={'clientnames': data['clientnames'], 'fields': 'name'},
-                                  verify=session.certfile)
-            clients = result.json().get('result')
-            if len(clients) != len(p.clients):
-                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(set(set(p.clients)-clients.keys()))))
+        if len(p.clients) > 0 and not p.no_validate:
+            missing = index.missing(p.clients)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(missing)))
 
-        result = requests.delete(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.delete(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
+            if len(p.clients) > 0:
+                index.remove(p.clients)
+            else:
+                index.clear()
             print('SUCCESS: Deleted clients')
             return
         raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
@@ -211,7 +350,7 @@ class Perform(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Perform, self).get_parser(prog_name)
         parser.add_argument('task')
         parser.add_argument('clients',  nargs='*', default=[])
@@ -219,38 +358,98 @@ class Perform(Command):
         parser.add_argument('-I', '--inventory', default=session.inventory)
         parser.add_argument('-S', '--synchronous', action='store_true')
         parser.add_argument('-K', '--kwargs', type=json.loads, help='BSON encoded key-value pairs', default={})
+        parser.add_argument('--batch-size', type=int, default=0,
+                            help='Roll out in waves of this many clients, each finished before the next starts')
+        parser.add_argument('--concurrency', type=int, default=1, help='Waves submitted at the same time')
+        parser.add_argument('--canary', type=int, default=0,
+                            help='Run this many clients alone first and wait for their results')
+        parser.add_argument('--max-failure-ratio', type=float, default=0.1,
+                            help='Stop the rollout when more clients of finished waves failed, '
+                                 'async waves are watched until their task finishes')
+        parser.add_argument('-W', '--wait', '--watch', action='store_true', help='Watch progress until the task finishes')
+        parser.add_argument('--timeout', type=float, default=None,
+                            help='Stop watching after this many seconds, per wave in rollouts where '
+                                 'clients still pending count as failed and which default to {:g}'.format(WAVE_TIMEOUT))
+        parser.add_argument('--shard-size', type=int, default=0, help='Split synchronous runs in shards of this size')
+        parser.add_argument('--parallel', type=int, default=4, help='Shards run at the same time')
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
-        data = {'async': int(not p.synchronous), 'task': p.task}
+        session = context.session()
+        method, url, kwargs = perform_request(session, p.admin, p.inventory, p.task, p.clients,
+                                              p.synchronous, p.kwargs)
+        data = kwargs['data']
 
-        if len(p.clients) > 0:
-            data['clientnames'] = ','.join(set(p.clients))
+        index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
 
-        if len(p.kwargs) > 0:
-            if not isinstance(p.kwargs, dict):
-                raise RuntimeError('kwargs: Must be BSON encoded key-value pairs')
-            data['kwargs'] = json.dumps(p.kwargs)
+        # Validate no extra clients
+        if len(p.clients) > 0 and not p.no_validate:
+            missing = index.missing(p.clients)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(missing)))
+
+        if p.batch_size > 0 or p.canary > 0:
+            return self.roll_out(session, url, data, p)
+
+        if p.synchronous and p.shard_size > 0:
+            names = self.target_names(session, url, p)
+            failed = rollout.run_shards(session, url, data, names, p.shard_size, p.parallel)
+            if failed > 0:
+                raise RuntimeError('ERROR: Task did not succeed on {} of {} clients'.format(failed, len(names)))
+            print('SUCCESS: Task finished on {} clients'.format(len(names)))
+            return
 
+        result = transport.request(method, url, **kwargs)
 
-        url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        # Validate no extra clients
+        print('SUCCESS: Submitted task')
+        if p.wait:
+            return watch.wait(session, url, p.task, self.target_names(session, url, p), p.timeout, self.app.stderr)
+
+    def target_names(self, session, url, p):
         if len(p.clients) > 0:
-            result = requests.get(url, params={'clientnames': data['clientnames'], 'fields': 'name'},
-                                  verify=session.certfile)
-            clients = result.json().get('result')
-            if len(clients) != len(p.clients):
-                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(set(set(p.clients)-clients.keys()))))
+            return sorted(set(p.clients))
+        result = transport.get(url, params={'fields': 'name'}, verify=session.certfile, stream=True)
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+        return [x.name for x in iter_clients(result)]
+
+    def roll_out(self, session, url, data, p):
+        names = self.target_names(session, url, p)
+
+        def submit(wave):
+            result = transport.post(url, data=dict(data, clientnames=','.join(wave)), verify=session.certfile,
+                                    auth=(session.username, session.password))
+            if result.status_code != requests.codes.ok:
+                raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+            if not p.synchronous:
+                # Async waves are watched, otherwise failures would never reach the failure ratio
+                watcher = watch.Watcher(session, url, p.task, wave, timeout=p.timeout or WAVE_TIMEOUT)
+                watcher.run()
+                return watcher.failed + len(watcher.pending)
+            # Synchronous waves are finished, count their failures
+            result = transport.get(url, params={'clientnames': ','.join(wave), 'fields': 'name,tasks'},
+                                   verify=session.certfile)
+            clients = result.json().get('result', {})
+            return sum(1 for x in clients.values()
+                       if (x.get('tasks') or {}).get(p.task, {}).get('status') == 'FAILED')
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        waves = rollout.plan(names, p.batch_size, p.canary)
+        run = rollout.Rollout(submit, p.concurrency, p.max_failure_ratio)
+        if p.canary > 0 and run.run(waves[:1]):
+            run.run(waves[1:])
+        elif p.canary == 0:
+            run.run(waves)
 
-        if result.status_code == requests.codes.ok:
-            print('SUCCESS: Submitted task')
-            return
-        raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+        if run.stopped:
+            raise RuntimeError('ERROR: Rollout stopped: {} of {} clients failed'.format(run.failed, run.done))
+        print('SUCCESS: Submitted task to {} clients in {} waves'.format(run.done, len(waves)))
+        if run.failed > 0:
+            self.log.error('ERROR: Task failed on {} of {} clients'.format(run.failed, run.done))
+            return 1
 
 
 class StatTasks(ShowOne):
@@ -259,40 +458,29 @@ class StatTasks(ShowOne):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(StatTasks, self).get_parser(prog_name)
         parser.add_argument('tasks', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-L', '--local', action='store_true', help='Use the local snapshot (see: ultron sync)')
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+
+        if p.local:
+            tasks = snapshot.stat_tasks(session.endpoint, p.admin, p.inventory, p.tasks)
+            return [tasks.keys(), tasks.values()]
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
-        result = requests.get(url, verify=session.certfile)
+        stats = aggregate.TaskStats(p.tasks)
+        result = transport.get(url, params=projection.plan(stats.fields), verify=session.certfile, stream=True)
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        clients = result.json().get('result', {})
-
-        if len(clients) == 0:
-            raise RuntimeError('ERROR: Clients not found')
-
-        tasks = {}
-        for client in clients.values():
-            if not client['tasks']: continue
-            for k, v in client['tasks'].items():
-                if len(p.tasks) > 0 and k not in p.tasks: continue
-                if k not in tasks:
-                    tasks[k] = {
-                        'performed on': 0, 'success': 0,
-                        'failed': 0, 'pending': 0
-                    }
-                tasks[k]['performed on'] += 1
-                tasks[k][v['status'].lower()] += 1
-
+        tasks = aggregate.aggregate(iter_clients(result), [stats])[0].result()
         return [tasks.keys(), tasks.values()]
 
 
@@ -302,38 +490,38 @@ class StatStates(ShowOne):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(StatStates, self).get_parser(prog_name)
         parser.add_argument('states', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-L', '--local', action='store_true', help='Use the local snapshot (see: ultron sync)')
+        parser.add_argument('-a', '--approximate', action='store_true',
+                            help='Summarize every key by its distinct count and top values')
+        parser.add_argument('-k', '--top', type=int, default=10, help='Top values per key with --approximate')
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+
+        if p.local:
+            if p.approximate:
+                states = snapshot.summary_states(session.endpoint, p.admin, p.inventory, p.states, p.top)
+            else:
+                states = snapshot.stat_states(session.endpoint, p.admin, p.inventory, p.states)
+            return [states.keys(), states.values()]
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
-        result = requests.get(url, verify=session.certfile)
+        if p.approximate:
+            stats = aggregate.StateSketch(p.states, p.top)
+        else:
+            stats = aggregate.StateStats(p.states)
+        result = transport.get(url, params=projection.plan(stats.fields), verify=session.certfile, stream=True)
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        clients = result.json().get('result', {})
-
-        if len(clients) == 0:
-            raise RuntimeError('ERROR: Clients not found')
-
-        states = {}
-        for client in clients.values():
-            for k, v in client['state'].items():
-                if len(p.states) > 0 and k not in p.states: continue
-                if k not in states: states[k] = {}
-                if v not in states[k]: states[k][v] = 0
-                states[k][v] += 1
-
-        for k,v in states.items():
-            if len(v) > 15:
-                del states[k]
+        states = aggregate.aggregate(iter_clients(result), [stats])[0].result()
         return [states.keys(), states.values()]
 
 
@@ -343,80 +531,139 @@ class StatProps(ShowOne):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(StatProps, self).get_parser(prog_name)
         parser.add_argument('props', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-L', '--local', action='store_true', help='Use the local snapshot (see: ultron sync)')
+        parser.add_argument('-a', '--approximate', action='store_true',
+                            help='Summarize every key by its distinct count and top values')
+        parser.add_argument('-k', '--top', type=int, default=10, help='Top values per key with --approximate')
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+
+        if p.local:
+            if p.approximate:
+                props = snapshot.summary_props(session.endpoint, p.admin, p.inventory, p.props, p.top)
+            else:
+                props = snapshot.stat_props(session.endpoint, p.admin, p.inventory, p.props)
+            return [props.keys(), props.values()]
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
-        result = requests.get(url, verify=session.certfile)
+        if p.approximate:
+            stats = aggregate.PropSketch(p.props, p.top)
+        else:
+            stats = aggregate.PropStats(p.props)
+        result = transport.get(url, params=projection.plan(stats.fields), verify=session.certfile, stream=True)
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        clients = result.json().get('result', {})
-
-        if len(clients) == 0:
-            raise RuntimeError('ERROR: Clients not found')
-
-        props = {}
-        for client in clients.values():
-            for k, v in client['props'].items():
-                if len(p.props) > 0 and k not in p.props: continue
-                if k not in props: props[k] = {}
-                if v not in props[k]: props[k][v] = 0
-                props[k][v] += 1
-
-        for k,v in props.items():
-            if len(v) > 15:
-                del props[k]
+        props = aggregate.aggregate(iter_clients(result), [stats])[0].result()
         return [props.keys(), props.values()]
 
 
+class StatAll(ShowOne):
+    "Show statistics of client tasks, states and props at once"
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        session = context.session()
+        parser = super(StatAll, self).get_parser(prog_name)
+        parser.add_argument('-d', '--dimensions', nargs='*', choices=aggregate.DIMENSIONS.keys(),
+                            default=list(aggregate.DIMENSIONS.keys()))
+        parser.add_argument('-A', '--admin', default=session.username)
+        parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-L', '--local', action='store_true', help='Use the local snapshot (see: ultron sync)')
+        parser.add_argument('-C', '--columnar', action='store_true',
+                            help='Aggregate on a numpy column table, exact top values with --approximate')
+        parser.add_argument('-a', '--approximate', action='store_true',
+                            help='Summarize every key by its distinct count and top values')
+        parser.add_argument('-k', '--top', type=int, default=10, help='Top values per key with --approximate')
+        return parser
+
+    def take_action(self, p):
+        session = context.session()
+        dimensions = [x for x in aggregate.DIMENSIONS.keys() if x in p.dimensions]
+
+        if p.local:
+            local = {'tasks': snapshot.stat_tasks, 'states': snapshot.stat_states, 'props': snapshot.stat_props}
+            if p.approximate:
+                local['states'] = lambda *args: snapshot.summary_states(*args, top=p.top)
+                local['props'] = lambda *args: snapshot.summary_props(*args, top=p.top)
+            results = [local[x](session.endpoint, p.admin, p.inventory) for x in dimensions]
+        else:
+            url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
+
+            if p.approximate:
+                stats = [aggregate.SKETCHES[x](top=p.top) if x in aggregate.SKETCHES else aggregate.DIMENSIONS[x]()
+                         for x in dimensions]
+            else:
+                stats = [aggregate.DIMENSIONS[x]() for x in dimensions]
+            params = projection.plan(*[x.fields for x in stats])
+            result = transport.get(url, params=params, verify=session.certfile, stream=True)
+            if result.status_code != requests.codes.ok:
+                raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+
+            if p.columnar:
+                table = columnar.ClientTable.from_clients(iter_clients(result))
+                columns = {'tasks': table.task_stats, 'states': lambda: table.histogram('state'),
+                           'props': lambda: table.histogram('props')}
+                if p.approximate:
+                    columns['states'] = lambda: table.summary('state', top=p.top)
+                    columns['props'] = lambda: table.summary('props', top=p.top)
+                results = [columns[x]() for x in dimensions]
+            else:
+                aggregate.aggregate(iter_clients(result), stats)
+                results = [x.result() for x in stats]
+
+        keys, values = [], []
+        for dimension, result in zip(dimensions, results):
+            for k, v in result.items():
+                keys.append('{}.{}'.format(dimension, k))
+                values.append(v)
+        return [keys, values]
+
+
 class FilterTask(Lister):
     "List clients filtered by task status"
 
     log = logging.getLogger(__name__)
 
+    fields = ('name', 'tasks')
+
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(FilterTask, self).get_parser(prog_name)
         parser.add_argument('task')
         parser.add_argument('value')
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-L', '--local', action='store_true', help='Use the local snapshot (see: ultron sync)')
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+
+        if p.local:
+            found = snapshot.filter_task(session.endpoint, p.admin, p.inventory, p.task, p.value)
+            return [['name'], [[x] for x in found]]
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
-        result = requests.get(url, verify=session.certfile)
+        result = transport.get(url, params=projection.plan(self.fields), verify=session.certfile, stream=True)
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        clients = result.json().get('result', {})
+        return [['name'], ([x.name] for x in iter_clients(result) if self.match(x, p))]
 
-        if len(clients) == 0:
-            raise RuntimeError('ERROR: Clients not found')
-
-        found = set()
-        for client in clients.values():
-            if not client['tasks']: continue
-            if client['tasks'][p.task]['status'] != p.value.upper():
-                if p.value == 'performed on':
-                    found.add(client['name'])
-                    continue
-                continue
-            found.add(client['name'])
-
-        return [['name'], [[x] for x in found]]
+    def match(self, client, p):
+        if p.task not in client.tasks: return False
+        return p.value == 'performed on' or client.tasks[p.task] == p.value.upper()
 
 
 class FilterState(Lister):
@@ -424,37 +671,35 @@ class FilterState(Lister):
 
     log = logging.getLogger(__name__)
 
+    fields = ('name', 'state')
+
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(FilterState, self).get_parser(prog_name)
         parser.add_argument('state')
         parser.add_argument('value')
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-L', '--local', action='store_true', help='Use the local snapshot (see: ultron sync)')
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+
+        if p.local:
+            found = snapshot.filter_state(session.endpoint, p.admin, p.inventory, p.state, p.value)
+            return [['name'], [[x] for x in found]]
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
-        result = requests.get(url, verify=session.certfile)
+        result = transport.get(url, params=projection.plan(self.fields), verify=session.certfile, stream=True)
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        clients = result.json().get('result', {})
+        return [['name'], ([x.name] for x in iter_clients(result) if self.match(x, p))]
 
-        if len(clients) == 0:
-            raise RuntimeError('ERROR: Clients not found')
-
-        found = set()
-        for client in clients.values():
-            if p.state not in client['state']: continue
-            if str(client['state'][p.state]) != p.value:
-                    continue
-            found.add(client['name'])
-
-        return [['name'], [[x] for x in found]]
+    def match(self, client, p):
+        return p.state in client.state and str(client.state[p.state]) == p.value
 
 
 class FilterProp(Lister):
@@ -462,34 +707,32 @@ class FilterProp(Lister):
 
     log = logging.getLogger(__name__)
 
+    fields = ('name', 'props')
+
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(FilterProp, self).get_parser(prog_name)
         parser.add_argument('prop')
         parser.add_argument('value')
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-L', '--local', action='store_true', help='Use the local snapshot (see: ultron sync)')
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
+
+        if p.local:
+            found = snapshot.filter_prop(session.endpoint, p.admin, p.inventory, p.prop, p.value)
+            return [['name'], [[x] for x in found]]
 
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
-        result = requests.get(url, verify=session.certfile)
+        result = transport.get(url, params=projection.plan(self.fields), verify=session.certfile, stream=True)
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        clients = result.json().get('result', {})
-
-        if len(clients) == 0:
-            raise RuntimeError('ERROR: Clients not found')
-
-        found = set()
-        for client in clients.values():
-            if p.prop not in client['props']: continue
-            if str(client['props'][p.prop]) != p.value:
-                    continue
-            found.add(client['name'])
+        return [['name'], ([x.name] for x in iter_clients(result) if self.match(x, p))]
 
-        return [['name'], [[x] for x in found]]
+    def match(self, client, p):
+        return p.prop in client.props and str(client.props[p.prop]) == p.value
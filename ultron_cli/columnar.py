@@ -0,0 +1,102 @@
+from array import array
+from collections import OrderedDict
+from ultron_cli import sketch, trace
+
+# Imported on first use, numpy alone takes longer than the rest of startup
+numpy = None
+
+
+def load_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError('ERROR: Columnar mode requires numpy, install: ultron-cli[columnar]')
+    return numpy
+
+
+class Column(object):
+    "Dictionary encoded values of one key, stored as (row, code) pairs"
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+        self.rows = array('i')
+        self.codes = array('i')
+
+    def append(self, row, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.rows.append(row)
+        self.codes.append(code)
+
+    def counts(self):
+        codes = numpy.frombuffer(self.codes, dtype=numpy.int32)
+        return numpy.bincount(codes, minlength=len(self.values))
+
+
+class ClientTable(object):
+    """Columnar view of a client listing.
+
+    Every prop, state and task of the listing becomes a dictionary
+    encoded integer column, so the histograms and exact summaries of all
+    dimensions are counted from one table with numpy.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.columns = OrderedDict([('tasks', OrderedDict()), ('state', OrderedDict()), ('props', OrderedDict())])
+
+    @classmethod
+    @trace.traced('columnar load')
+    def from_clients(cls, clients):
+        load_numpy()
+        table = cls()
+        for client in clients:
+            table.append(client)
+        return table
+
+    def append(self, client):
+        row = len(self.names)
+        self.names.append(client.name)
+        for field, columns in self.columns.items():
+            for k, v in getattr(client, field).items():
+                if k not in columns: columns[k] = Column()
+                columns[k].append(row, v)
+
+    @trace.traced('columnar aggregate')
+    def task_stats(self, names=()):
+        tasks = OrderedDict()
+        for k, column in self.columns['tasks'].items():
+            if len(names) > 0 and k not in names: continue
+            tasks[k] = {
+                'performed on': len(column.rows), 'success': 0,
+                'failed': 0, 'pending': 0
+            }
+            for v, count in zip(column.values, column.counts()):
+                tasks[k][v.lower()] = int(count)
+        return tasks
+
+    @trace.traced('columnar aggregate')
+    def histogram(self, field, names=(), limit=15):
+        result = OrderedDict()
+        for k, column in self.columns[field].items():
+            if len(names) > 0 and k not in names: continue
+            if len(column.values) > limit: continue
+            result[k] = {v: int(c) for v, c in zip(column.values, column.counts())}
+        return result
+
+    @trace.traced('columnar aggregate')
+    def summary(self, field, names=(), top=10):
+        "Distinct count and most common values of every key, like aggregate.Sketch but exact"
+        result = OrderedDict()
+        for k, column in self.columns[field].items():
+            if len(names) > 0 and k not in names: continue
+            counts = column.counts()
+            ranked = numpy.argsort(-counts, kind='stable')[:top]
+            result[k] = sketch.summary(len(column.values), OrderedDict(
+                (column.values[x], int(counts[x])) for x in ranked))
+        return result
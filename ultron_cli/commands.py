@@ -0,0 +1,48 @@
+# Registered as ultron.cli entry points by setup.py and read directly by
+# ultron_cli.main, so startup neither scans installed distributions nor
+# imports every command module. Keep both in sync by editing only this list.
+COMMANDS = [
+    ('connect', 'ultron_cli.session:Connect'),
+    ('disconnect', 'ultron_cli.session:Disconnect'),
+    ('inventory', 'ultron_cli.session:DefaultInventory'),
+    ('list profiles', 'ultron_cli.session:ListProfiles'),
+    ('new profile', 'ultron_cli.session:NewProfile'),
+    ('delete profile', 'ultron_cli.session:DeleteProfile'),
+    ('sync', 'ultron_cli.snapshot:Sync'),
+    ('apply', 'ultron_cli.manifest:Apply'),
+    ('agent', 'ultron_cli.daemon:Agent'),
+    ('batch', 'ultron_cli.batch:Batch'),
+    ('bench', 'ultron_cli.bench:Bench'),
+
+    ('new admins', 'ultron_cli.admins:New'),
+    ('list admins', 'ultron_cli.admins:List'),
+    ('update admins', 'ultron_cli.admins:Update'),
+    ('delete admins', 'ultron_cli.admins:Delete'),
+    ('show admin', 'ultron_cli.admins:Show'),
+
+    ('list tasks', 'ultron_cli.admins:ListTasks'),
+    ('list inventories', 'ultron_cli.admins:ListInventories'),
+
+    ('new groups', 'ultron_cli.groups:New'),
+    ('list groups', 'ultron_cli.groups:List'),
+    ('update groups', 'ultron_cli.groups:Update'),
+    ('delete groups', 'ultron_cli.groups:Delete'),
+    ('show group', 'ultron_cli.groups:Show'),
+    ('perform on group', 'ultron_cli.groups:Perform'),
+    ('append clients to group', 'ultron_cli.groups:AppendClients'),
+    ('remove clients from group', 'ultron_cli.groups:RemoveClients'),
+
+    ('new clients', 'ultron_cli.clients:New'),
+    ('list clients', 'ultron_cli.clients:List'),
+    ('update clients', 'ultron_cli.clients:Update'),
+    ('delete clients', 'ultron_cli.clients:Delete'),
+    ('perform on clients', 'ultron_cli.clients:Perform'),
+    ('stat client tasks', 'ultron_cli.clients:StatTasks'),
+    ('filter client task', 'ultron_cli.clients:FilterTask'),
+    ('filter client state', 'ultron_cli.clients:FilterState'),
+    ('filter client prop', 'ultron_cli.clients:FilterProp'),
+    ('stat client states', 'ultron_cli.clients:StatStates'),
+    ('stat client props', 'ultron_cli.clients:StatProps'),
+    ('stat client all', 'ultron_cli.clients:StatAll'),
+    ('show client', 'ultron_cli.clients:Show'),
+]
@@ -1 +1,15 @@
+import os
+
+
 VERSION = 'v1.0.0'
+
+# HTTP transport tuning, see ultron_cli.transport
+POOL_SIZE = int(os.environ.get('ULTRON_POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.environ.get('ULTRON_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.environ['ULTRON_READ_TIMEOUT']) if os.environ.get('ULTRON_READ_TIMEOUT') else None
+
+# Seconds a cached name index answers validation checks, see ultron_cli.nameindex
+NAMES_TTL = float(os.environ.get('ULTRON_NAMES_TTL', 300))
+
+# Seconds an async rollout wave is watched before its pending clients count as failed, see ultron_cli.clients
+WAVE_TIMEOUT = float(os.environ.get('ULTRON_WAVE_TIMEOUT', 600))
@@ -0,0 +1,106 @@
+import os
+import json
+import getpass
+from attrdict import AttrDict
+
+
+sessionfile = os.path.expanduser('~/.ultron_session.json')
+
+FIELDS = ('endpoint', 'username', 'password', 'inventory', 'certfile')
+
+
+def default():
+    return {
+        'username': getpass.getuser(),
+        'password': 'fakepass',
+        'endpoint': 'https://localhost:5050/api/v1.0',
+        'inventory': 'test',
+        'certfile': False
+    }
+
+
+class SessionContext(object):
+    "Session file parsed once per process and reloaded when it changes on disk"
+
+    def __init__(self, path=sessionfile):
+        self.path = path
+        self.profile = os.environ.get('ULTRON_PROFILE') or None
+        self.stamp = None
+        self.data = None
+        self.sessions = {}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.save(default())
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp != self.stamp:
+            with open(self.path) as f:
+                try:
+                    data = json.load(f)
+                except ValueError as e:
+                    raise RuntimeError('ERROR: Invalid session file {}: {}'.format(self.path, e))
+            if not isinstance(data, dict) or not isinstance(data.get('profiles', {}), dict):
+                raise RuntimeError('ERROR: Invalid session file {}'.format(self.path))
+            self.data, self.stamp, self.sessions = data, stamp, {}
+        return self.data
+
+    def profiles(self):
+        return self.load().get('profiles', {})
+
+    def session(self, profile=None):
+        "Session of a profile, the active one by default"
+        profile = profile or self.profile
+        data = self.load()
+        if profile not in self.sessions:
+            merged = {k: v for k, v in data.items() if k != 'profiles'}
+            if profile is not None:
+                if profile not in self.profiles():
+                    raise RuntimeError('ERROR: Profile not found: {}'.format(profile))
+                merged.update(self.profiles()[profile])
+            missing = [x for x in FIELDS if x not in merged]
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: Invalid session file {}: missing {}'.format(self.path, ', '.join(missing)))
+            self.sessions[profile] = AttrDict(merged)
+        return self.sessions[profile]
+
+    def save(self, data):
+        tmp = '{}.{}'.format(self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.chmod(tmp, 0o600)
+        os.rename(tmp, self.path)
+        self.stamp = None
+
+    def update(self, **fields):
+        "Set fields of the active profile, or of the default session without one"
+        data = dict(self.load())
+        if self.profile is None:
+            data.update(fields)
+        else:
+            profiles = dict(self.profiles())
+            profiles[self.profile] = dict(profiles.get(self.profile, {}), **fields)
+            data['profiles'] = profiles
+        self.save(data)
+
+    def set_profile(self, name, fields):
+        data = dict(self.load())
+        profiles = dict(self.profiles())
+        if fields is None:
+            profiles.pop(name, None)
+        else:
+            profiles[name] = fields
+        data['profiles'] = profiles
+        self.save(data)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.stamp = None
+
+
+context = SessionContext()
+
+
+def session(profile=None):
+    return context.session(profile)
@@ -0,0 +1,143 @@
+import io
+import os
+import sys
+import json
+import time
+import logging
+import socketserver
+from cliff.command import Command
+from ultron_cli import agent
+
+
+class NeedsTerminal(RuntimeError):
+    pass
+
+
+class NoInput(io.TextIOBase):
+    "Stdin of forwarded commands, those reading it are run by the CLI itself"
+
+    touched = False
+
+    def touch(self, *args, **kwargs):
+        self.touched = True
+        raise NeedsTerminal('ERROR: Input is not forwarded to the agent')
+
+    read = readline = readlines = fileno = isatty = __iter__ = touch
+
+
+def run(argv, cwd, env):
+    "Run one command line in this process with its output captured"
+    from ultron_cli.app import UltronCli
+    from ultron_cli import transport
+    changes = transport.changes
+    stdin, stdout, stderr = NoInput(), io.StringIO(), io.StringIO()
+    saved = sys.stdin, sys.stdout, sys.stderr, os.getcwd()
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    environ = {k: v for k, v in os.environ.items() if k.startswith('ULTRON_')}
+    try:
+        sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+        os.chdir(cwd)
+        for k in environ:
+            os.environ.pop(k)
+        os.environ.update(env)
+        try:
+            code = UltronCli(stdin, stdout, stderr).run(argv)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception as e:
+            stderr.write('{}\n'.format(e))
+            code = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved[:3]
+        os.chdir(saved[3])
+        for k in env:
+            os.environ.pop(k, None)
+        os.environ.update(environ)
+        # cliff adds its handlers on every run
+        for handler in root.handlers:
+            if handler not in handlers:
+                handler.close()
+        root.handlers, root.level = handlers, level
+
+    if stdin.touched and transport.changes == changes:
+        return {'local': True}
+    if stdin.touched:
+        # Running it again locally would repeat the changes already sent
+        stderr.write('ERROR: Command read stdin after changing the server, run it with ULTRON_AGENT=0\n')
+    return {'code': code or 0, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        if request.get('stop'):
+            self.server.stopping = True
+            response = {'code': 0}
+        elif request.get('ping'):
+            response = {'code': 0, 'pid': os.getpid()}
+        else:
+            response = run(request['argv'], request['cwd'], request.get('env', {}))
+        self.wfile.write(json.dumps(response).encode('utf-8'))
+
+
+def serve(path):
+    "Serve commands one at a time until asked to stop"
+    from ultron_cli import nameindex
+    nameindex.background = True
+    if os.path.exists(path):
+        if agent.call({'ping': True}, path) is not None:
+            raise RuntimeError('ERROR: Agent already running on {}'.format(path))
+        os.remove(path)
+    server = socketserver.UnixStreamServer(path, Handler)
+    server.stopping = False
+    os.chmod(path, 0o600)
+    try:
+        while not server.stopping:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+class Agent(Command):
+    "Run a local agent keeping connections and caches warm for the CLI"
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(Agent, self).get_parser(prog_name)
+        parser.add_argument('-s', '--socket', default=agent.socketfile, help='Unix socket to listen on')
+        parser.add_argument('-D', '--detach', action='store_true', help='Run in the background')
+        parser.add_argument('--stop', action='store_true', help='Stop a running agent')
+        return parser
+
+    def take_action(self, p):
+        if p.stop:
+            if agent.call({'stop': True}, p.socket) is None:
+                raise RuntimeError('ERROR: No agent running on {}'.format(p.socket))
+            print('SUCCESS: Stopped agent')
+            return
+
+        if not p.detach:
+            self.log.info('Agent listening on {}'.format(p.socket))
+            serve(p.socket)
+            return
+
+        if os.fork() > 0:
+            for _ in range(100):
+                if agent.call({'ping': True}, p.socket) is not None: break
+                time.sleep(0.05)
+            else:
+                raise RuntimeError('ERROR: Agent did not start on {}'.format(p.socket))
+            print('SUCCESS: Agent listening on {}'.format(p.socket))
+            return
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        try:
+            serve(p.socket)
+        finally:
+            os._exit(0)
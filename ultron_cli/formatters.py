@@ -0,0 +1,14 @@
+import json
+from cliff.formatters.base import ListFormatter
+
+
+class JSONLinesFormatter(ListFormatter):
+    "One JSON object per row, written as soon as the row is produced"
+
+    def add_argument_group(self, parser):
+        pass
+
+    def emit_list(self, column_names, data, stdout, parsed_args):
+        for row in data:
+            stdout.write(json.dumps(dict(zip(column_names, row))) + '\n')
+            stdout.flush()
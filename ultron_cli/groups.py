@@ -1,15 +1,34 @@
-import os
 import json
 import logging
 import requests
-from attrdict import AttrDict
 from cliff.lister import Lister
 from cliff.command import Command
 from cliff.show import ShowOne
-from prompt_toolkit import prompt
+from ultron_cli import transport, stream, watch, rollout, nameindex, context, clients
 
 
-sessionfile = os.path.expanduser('~/.ultron_session.json')
+def group_clients(session, admin, inventory, group):
+    "Names of the clients in a group"
+    url = '{}/clients/{}/{}'.format(session.endpoint, admin, inventory)
+    result = transport.get(url, params={'fields': 'name', 'dynfields': 'groups'},
+                           verify=session.certfile, stream=True)
+    if result.status_code != requests.codes.ok:
+        raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+    return [k for k, v in stream.iter_result(result) if group in v['groups']]
+
+
+def list_request(session, admin, inventory):
+    "Method, url and arguments of a request listing the groups of an inventory with their sizes"
+    url = '{}/groups/{}/{}'.format(session.endpoint, admin, inventory)
+    return 'GET', url, {'params': {'fields': 'name', 'dynfields': 'count_clients'}, 'verify': session.certfile,
+                        'auth': (session.username, session.password)}
+
+
+def perform_request(session, admin, inventory, group, task, synchronous=False, kwargs=None):
+    "Method, url and arguments of a request performing task on a group"
+    _, _, request = clients.perform_request(session, admin, inventory, task, (), synchronous, kwargs)
+    url = '{}/groups/{}/{}/{}'.format(session.endpoint, admin, inventory, group)
+    return 'POST', url, request
 
 
 class List(Lister):
@@ -18,17 +37,16 @@ class List(Lister):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(List, self).get_parser(prog_name)
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
-        url = '{}/groups/{}/{}'.format(session.endpoint, p.admin, p.inventory)
-        result = requests.get(url, params={'fields': 'name', 'dynfields': 'count_clients'},
-                verify=session.certfile, auth=(session.username, session.password))
+        session = context.session()
+        method, url, kwargs = list_request(session, p.admin, p.inventory)
+        result = transport.request(method, url, **kwargs)
 
         if result.status_code == requests.codes.ok:
             groups = result.json().get('result', {})
@@ -45,7 +63,7 @@ class Show(ShowOne):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Show, self).get_parser(prog_name)
         parser.add_argument('group')
         parser.add_argument('-A', '--admin', default=session.username)
@@ -55,7 +73,7 @@ class Show(ShowOne):
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         params = {}
         if len(p.fields) > 0:
             params['fields'] = ','.join(p.fields)
@@ -64,7 +82,7 @@ class Show(ShowOne):
             params['dynfields'] = ','.join(p.dynfields)
 
         url = '{}/groups/{}/{}/{}'.format(session.endpoint, p.admin, p.inventory, p.group)
-        result = requests.get(url, params=params, verify=session.certfile)
+        result = transport.get(url, params=params, verify=session.certfile)
 
         if result.status_code == requests.codes.ok:
             group = result.json().get('result',{}).get(p.group)
@@ -80,18 +98,20 @@ class New(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(New, self).get_parser(prog_name)
         parser.add_argument('groups', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
         parser.add_argument('-D', '--description', default='')
         parser.add_argument('-P', '--props', nargs='*', default=[])
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         if len(p.groups) == 0:
+            from prompt_toolkit import prompt
             groupnames = prompt('Enter group names and press ESC+ENTER\n> ', multiline=True).splitlines()
         else:
             groupnames = p.groups
@@ -110,17 +130,19 @@ class New(Command):
 
         url = '{}/groups/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
+        index = nameindex.NameIndex(session, 'groups', p.admin, p.inventory, p.trust_cache)
+
         # Validate if already exists
-        result = requests.get(url, params={'groupnames': data['groupnames'], 'fields': 'name'},
-                              verify=session.certfile)
-        groups = result.json().get('result')
-        if len(groups) > 0:
-            raise RuntimeError('ERROR: Duplicate groups: {}'.format(', '.join(groups.keys())))
+        if not p.no_validate:
+            groups = index.existing(groupnames)
+            if len(groups) > 0:
+                raise RuntimeError('ERROR: Duplicate groups: {}'.format(', '.join(groups)))
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.post(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
+            index.add(groupnames)
             print('SUCCESS: Created new groups')
         else:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
@@ -132,17 +154,18 @@ class Update(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Update, self).get_parser(prog_name)
         parser.add_argument('groups', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
         parser.add_argument('-D', '--description', default=None)
         parser.add_argument('-P', '--props', nargs='*', default=[])
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         data = {}
         if len(p.groups) > 0:
             data['groupnames'] = ','.join(set(p.groups))
@@ -158,16 +181,16 @@ class Update(Command):
 
         url = '{}/groups/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
+        index = nameindex.NameIndex(session, 'groups', p.admin, p.inventory, p.trust_cache)
+
         # Validate no extra groups
-        if len(p.groups) > 0:
-            result = requests.get(url, params={'groupnames': data['groupnames'], 'fields': 'name'},
-                                  verify=session.certfile)
-            groups = result.json().get('result')
-            if len(groups) != len(p.groups):
-                raise RuntimeError('ERROR: groups not found: {}'.format(', '.join(set(set(p.groups)-groups.keys()))))
+        if len(p.groups) > 0 and not p.no_validate:
+            missing = index.missing(p.groups)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: groups not found: {}'.format(', '.join(missing)))
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.post(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             print('SUCCESS: Updated groups')
@@ -181,33 +204,38 @@ class Delete(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Delete, self).get_parser(prog_name)
         parser.add_argument('groups', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         data = {}
         if len(p.groups) > 0:
             data = {'groupnames': ','.join(set(p.groups))}
 
         url = '{}/groups/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
+        index = nameindex.NameIndex(session, 'groups', p.admin, p.inventory, p.trust_cache)
+
         # Validate no extra groups
-        if len(p.groups) > 0:
-            result = requests.get(url, params={'groupnames': data['groupnames'], 'fields': 'name'},
-                                  verify=session.certfile)
-            groups = result.json().get('result')
-            if len(groups) != len(p.groups):
-                raise RuntimeError('ERROR: groups not found: {}'.format(', '.join(set(set(p.groups)-groups.keys()))))
+        if len(p.groups) > 0 and not p.no_validate:
+            missing = index.missing(p.groups)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: groups not found: {}'.format(', '.join(missing)))
 
-        result = requests.delete(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
+        result = transport.delete(url, data=data, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
+            if len(p.groups) > 0:
+                index.remove(p.groups)
+            else:
+                index.clear()
             print('SUCCESS: Deleted groups')
         else:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
@@ -218,7 +246,7 @@ class Perform(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Perform, self).get_parser(prog_name)
         parser.add_argument('task')
         parser.add_argument('group')
@@ -226,26 +254,37 @@ class Perform(Command):
         parser.add_argument('-I', '--inventory', default=session.inventory)
         parser.add_argument('-S', '--synchronous', action='store_true')
         parser.add_argument('-K', '--kwargs', type=json.loads, help='BSON encoded key-value pairs', default={})
+        parser.add_argument('-W', '--wait', '--watch', action='store_true', help='Watch progress until the task finishes')
+        parser.add_argument('--timeout', type=float, default=None, help='Stop watching after this many seconds')
+        parser.add_argument('--shard-size', type=int, default=0, help='Split synchronous runs in shards of this size')
+        parser.add_argument('--parallel', type=int, default=4, help='Shards run at the same time')
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
-        data = {'async': int(not p.synchronous), 'task': p.task}
+        session = context.session()
+        method, url, kwargs = perform_request(session, p.admin, p.inventory, p.group, p.task,
+                                              p.synchronous, p.kwargs)
+        data = kwargs['data']
+        clients_url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
+
+        if p.synchronous and p.shard_size > 0:
+            # Shards are run as client tasks, the group endpoint takes no client subset
+            names = group_clients(session, p.admin, p.inventory, p.group)
+            failed = rollout.run_shards(session, clients_url, data, names, p.shard_size, p.parallel)
+            if failed > 0:
+                raise RuntimeError('ERROR: Task did not succeed on {} of {} clients'.format(failed, len(names)))
+            print('SUCCESS: Task finished on {} clients'.format(len(names)))
+            return
 
-        if len(p.kwargs) > 0:
-            if not isinstance(p.kwargs, dict):
-                raise RuntimeError('kwargs: Must be BSON encoded key-value pairs')
-            data['kwargs'] = json.dumps(p.kwargs)
+        result = transport.request(method, url, **kwargs)
 
-        url = '{}/groups/{}/{}/{}'.format(session.endpoint, p.admin, p.inventory, p.group)
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
-        result = requests.post(url, data=data, verify=session.certfile,
-                               auth=(session.username, session.password))
-
-        if result.status_code == requests.codes.ok:
-            print('SUCCESS: Submitted task')
-            return
-        raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+        print('SUCCESS: Submitted task')
+        if p.wait:
+            names = group_clients(session, p.admin, p.inventory, p.group)
+            return watch.wait(session, clients_url, p.task, names, p.timeout, self.app.stderr)
 
 
 class AppendClients(Command):
@@ -254,35 +293,34 @@ class AppendClients(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(AppendClients, self).get_parser(prog_name)
         parser.add_argument('group')
         parser.add_argument('clients', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
-
-        params = {'fields': 'name'}
-        if len(p.clients) > 0:
-            params['clientnames'] = ','.join(p.clients)
-
-        url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
-        result = requests.get(url, params=params, verify=session.certfile)
-        if result.status_code != requests.codes.ok:
-            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
-
-        clients = result.json().get('result', {})
-
-        if len(p.clients) > 0 and len(clients) != len(p.clients):
-            raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(set(set(p.clients)-clients.keys()))))
+        session = context.session()
+
+        index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
+        if len(p.clients) == 0:
+            # All clients, a fresh listing unless the cache is trusted
+            clients = index.names() if p.trust_cache else index.fetch()
+        elif p.no_validate:
+            clients = set(p.clients)
+        else:
+            clients = set(p.clients)
+            missing = index.missing(clients)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(missing)))
 
         url = '{}/groups/{}/{}/{}'.format(session.endpoint, p.admin, p.inventory, p.group)
-        clientnames = ','.join(clients.keys())
-        result = requests.post(url, data={'clientnames': clientnames}, verify=session.certfile,
-                               auth=(session.username, session.password))
+        clientnames = ','.join(clients)
+        result = transport.post(url, data={'clientnames': clientnames}, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             print('SUCCESS: Appended clients to group')
@@ -296,35 +334,34 @@ class RemoveClients(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(RemoveClients, self).get_parser(prog_name)
         parser.add_argument('group')
         parser.add_argument('clients', nargs='*', default=[])
         parser.add_argument('-A', '--admin', default=session.username)
         parser.add_argument('-I', '--inventory', default=session.inventory)
+        nameindex.add_arguments(parser)
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
-
-        params = {'fields': 'name'}
-        if len(p.clients) > 0:
-            params['clientnames'] = ','.join(p.clients)
-
-        url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
-        result = requests.get(url, params=params, verify=session.certfile)
-        if result.status_code != requests.codes.ok:
-            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
-
-        clients = result.json().get('result', {})
-
-        if len(p.clients) > 0 and len(clients) != len(p.clients):
-            raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(set(set(p.clients)-clients.keys()))))
+        session = context.session()
+
+        index = nameindex.NameIndex(session, 'clients', p.admin, p.inventory, p.trust_cache)
+        if len(p.clients) == 0:
+            # All clients, a fresh listing unless the cache is trusted
+            clients = index.names() if p.trust_cache else index.fetch()
+        elif p.no_validate:
+            clients = set(p.clients)
+        else:
+            clients = set(p.clients)
+            missing = index.missing(clients)
+            if len(missing) > 0:
+                raise RuntimeError('ERROR: Clients not found: {}'.format(', '.join(missing)))
 
         url = '{}/groups/{}/{}/{}'.format(session.endpoint, p.admin, p.inventory, p.group)
-        clientnames = ','.join(clients.keys())
-        result = requests.post(url, data={'clientnames': clientnames, 'action': 'remove'}, verify=session.certfile,
-                               auth=(session.username, session.password))
+        clientnames = ','.join(clients)
+        result = transport.post(url, data={'clientnames': clientnames, 'action': 'remove'}, verify=session.certfile,
+                                auth=(session.username, session.password))
 
         if result.status_code == requests.codes.ok:
             print('SUCCESS: Removed clients from group')
@@ -0,0 +1,190 @@
+import json
+import logging
+import requests
+from cliff.command import Command
+from ultron_cli import transport, stream, rollout, bulk, context
+
+
+class Action(object):
+    "One request of an apply plan"
+
+    def __init__(self, method, url, data, description):
+        self.method = method
+        self.url = url
+        self.data = data
+        self.description = description
+
+    def __str__(self):
+        return '{} {}'.format(self.method, self.description)
+
+
+def same(a, b):
+    return json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+
+def by_payload(items):
+    "Group (name, payload dict) pairs by identical payload"
+    groups = bulk.group_by_props(items)
+    return [(json.loads(k), v) for k, v in groups.items()]
+
+
+def encode(payload):
+    "Request data fields of a payload, props sent JSON encoded"
+    data = {}
+    if 'props' in payload:
+        data['props'] = json.dumps(payload['props'])
+    for k in ('description', 'password'):
+        if k in payload:
+            data[k] = payload[k]
+    return data
+
+
+class Apply(Command):
+    "Apply a YAML manifest of admins, groups and clients"
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        session = context.session()
+        parser = super(Apply, self).get_parser(prog_name)
+        parser.add_argument('manifest')
+        parser.add_argument('-A', '--admin', default=None)
+        parser.add_argument('-I', '--inventory', default=None)
+        parser.add_argument('-n', '--dry-run', action='store_true', help='Print the plan without applying it')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete admins, groups and clients missing from the manifest sections')
+        parser.add_argument('--concurrency', type=int, default=4, help='Requests sent at the same time')
+        parser.set_defaults(session_admin=session.username, session_inventory=session.inventory)
+        return parser
+
+    def fetch(self, session, url, params):
+        result = transport.get(url, params=params, verify=session.certfile, stream=True,
+                               auth=(session.username, session.password))
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+        return dict(stream.iter_result(result))
+
+    def plan(self, session, manifest, admin, inventory, prune):
+        "Phases of actions turning the current state into the manifest"
+        admins_url = '{}/admins'.format(session.endpoint)
+        clients_url = '{}/clients/{}/{}'.format(session.endpoint, admin, inventory)
+        groups_url = '{}/groups/{}/{}'.format(session.endpoint, admin, inventory)
+        want_admins = manifest.get('admins')
+        want_groups = manifest.get('groups')
+        want_clients = manifest.get('clients')
+        creates, updates, members, deletes = [], [], [], []
+
+        if want_admins is not None:
+            admins = self.fetch(session, admins_url, {'fields': 'name,props'})
+            new = [(k, v or {}) for k, v in want_admins.items() if k not in admins]
+            changed = [(k, {'props': v['props']}) for k, v in want_admins.items()
+                       if k in admins and 'props' in (v or {}) and not same(v['props'], admins[k].get('props'))]
+            for payload, names in by_payload(new):
+                creates.append(Action('POST', admins_url, dict(encode(payload), adminnames=','.join(names)),
+                                      'create admins: {}'.format(', '.join(names))))
+            for payload, names in by_payload(changed):
+                updates.append(Action('POST', admins_url, dict(encode(payload), adminnames=','.join(names)),
+                                      'update admins: {}'.format(', '.join(names))))
+            if prune:
+                gone = sorted(set(admins) - set(want_admins) - {session.username})
+                if len(gone) > 0:
+                    deletes.append(Action('DELETE', admins_url, {'adminnames': ','.join(gone)},
+                                          'delete admins: {}'.format(', '.join(gone))))
+
+        if want_clients is None and want_groups is None:
+            return [creates, updates, members, deletes]
+
+        # Group membership is read off the clients listing
+        clients = self.fetch(session, clients_url, {'fields': 'name,props', 'dynfields': 'groups'})
+
+        if want_clients is not None:
+            new = [(k, {'props': (v or {}).get('props', {})}) for k, v in want_clients.items() if k not in clients]
+            changed = [(k, {'props': v['props']}) for k, v in want_clients.items()
+                       if k in clients and 'props' in (v or {}) and not same(v['props'], clients[k].get('props'))]
+            for payload, names in by_payload(new):
+                creates.append(Action('POST', clients_url, dict(encode(payload), clientnames=','.join(names)),
+                                      'create clients: {}'.format(', '.join(names))))
+            for payload, names in by_payload(changed):
+                updates.append(Action('POST', clients_url, dict(encode(payload), clientnames=','.join(names)),
+                                      'update clients: {}'.format(', '.join(names))))
+            if prune:
+                gone = sorted(set(clients) - set(want_clients))
+                if len(gone) > 0:
+                    deletes.append(Action('DELETE', clients_url, {'clientnames': ','.join(gone)},
+                                          'delete clients: {}'.format(', '.join(gone))))
+
+        if want_groups is not None:
+            groups = self.fetch(session, groups_url, {'fields': 'name,description,props'})
+            known = set(clients) | set(want_clients or {})
+            new, changed = [], []
+            for k, v in want_groups.items():
+                v = v or {}
+                payload = {x: v[x] for x in ('description', 'props') if x in v}
+                if k not in groups:
+                    new.append((k, payload))
+                elif any(not same(payload[x], groups[k].get(x)) for x in payload):
+                    changed.append((k, payload))
+
+                if 'clients' not in v: continue
+                unknown = set(v['clients']) - known
+                if len(unknown) > 0:
+                    raise RuntimeError('ERROR: Group {}: clients not found: {}'.format(k, ', '.join(sorted(unknown))))
+                current = set(x for x, c in clients.items() if k in (c.get('groups') or []))
+                url = '{}/{}'.format(groups_url, k)
+                append = sorted(set(v['clients']) - current)
+                remove = sorted(current - set(v['clients']))
+                if len(append) > 0:
+                    members.append(Action('POST', url, {'clientnames': ','.join(append)},
+                                          'append to group {}: {}'.format(k, ', '.join(append))))
+                if len(remove) > 0:
+                    members.append(Action('POST', url, {'clientnames': ','.join(remove), 'action': 'remove'},
+                                          'remove from group {}: {}'.format(k, ', '.join(remove))))
+
+            for payload, names in by_payload(new):
+                creates.append(Action('POST', groups_url, dict(encode(payload), groupnames=','.join(names)),
+                                      'create groups: {}'.format(', '.join(names))))
+            for payload, names in by_payload(changed):
+                updates.append(Action('POST', groups_url, dict(encode(payload), groupnames=','.join(names)),
+                                      'update groups: {}'.format(', '.join(names))))
+            if prune:
+                gone = sorted(set(groups) - set(want_groups))
+                if len(gone) > 0:
+                    # Before client and admin deletions, which are later in the phase
+                    deletes.insert(0, Action('DELETE', groups_url, {'groupnames': ','.join(gone)},
+                                             'delete groups: {}'.format(', '.join(gone))))
+
+        return [creates, updates, members, deletes]
+
+    def send(self, session, action):
+        result = transport.request(action.method, action.url, data=action.data, verify=session.certfile,
+                                   auth=(session.username, session.password))
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}: {}'.format(action, result.status_code, result.json().get('message')))
+
+    def take_action(self, p):
+        import yaml
+        session = context.session()
+        with open(p.manifest) as f:
+            manifest = yaml.safe_load(f) or {}
+
+        admin = p.admin or manifest.get('admin') or p.session_admin
+        inventory = p.inventory or manifest.get('inventory') or p.session_inventory
+        phases = self.plan(session, manifest, admin, inventory, p.prune)
+        actions = [x for phase in phases for x in phase]
+
+        if len(actions) == 0:
+            print('SUCCESS: Nothing to change')
+            return
+        if p.dry_run:
+            for action in actions:
+                print(action)
+            return
+
+        for phase in phases:
+            if len(phase) == 0: continue
+            # Deletions depend on each other's order, the rest of a phase is independent
+            concurrency = 1 if phase[0].method == 'DELETE' else p.concurrency
+            for action, future in rollout.parallel(lambda x: self.send(session, x), phase, concurrency):
+                future.result()
+                self.log.info(str(action))
+        print('SUCCESS: Applied {} changes'.format(len(actions)))
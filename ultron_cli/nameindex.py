@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import requests
+from ultron_cli import transport, stream
+from ultron_cli.config import NAMES_TTL
+
+
+indexdir = os.path.expanduser('~/.ultron_names')
+
+# Parsed index files by path, reused by long-lived processes while unchanged on disk
+_parsed = {}
+
+# Set by long-lived processes (agent, shell, batch), which rebuild cold or stale indexes in the background
+background = False
+_refreshing = set()
+
+# Names checked per targeted request
+LOOKUP_SIZE = 200
+
+# Held from reading an index file until its replacement is in place, threads share index files
+_lock = threading.RLock()
+
+
+def add_arguments(parser):
+    "Validation options of the commands using a NameIndex"
+    parser.add_argument('--no-validate', action='store_true',
+                        help='Send the request without checking names first')
+    parser.add_argument('--trust-cache', action='store_true',
+                        help='Check names against the local index whatever its age')
+
+
+class NameIndex(object):
+    "Names of the admins, groups or clients of an inventory, cached on disk"
+
+    def __init__(self, session, kind, admin=None, inventory=None, trust=False, ttl=NAMES_TTL):
+        self.session = session
+        self.kind = kind
+        self.trust = trust
+        self.ttl = ttl
+        if kind == 'admins':
+            self.url = '{}/admins'.format(session.endpoint)
+        else:
+            self.url = '{}/{}/{}/{}'.format(session.endpoint, kind, admin, inventory)
+        self.param = '{}names'.format(kind[:-1])
+        key = hashlib.md5(self.url.encode('utf-8')).hexdigest()
+        self.path = os.path.join(indexdir, '{}.json'.format(key))
+        self.cached = None
+        self.lock = threading.Lock()
+
+    def read(self):
+        try:
+            st = os.stat(self.path)
+            key = (st.st_mtime_ns, st.st_size)
+            if _parsed.get(self.path, (None,))[0] != key:
+                with open(self.path) as f:
+                    data = json.load(f)
+                _parsed[self.path] = key, data.get('url'), data['time'], frozenset(data['names'])
+        except (IOError, OSError, ValueError, KeyError):
+            return None, None
+        _, url, stamp, names = _parsed[self.path]
+        if url != self.url:
+            return None, None
+        return stamp, names
+
+    def load(self):
+        stamp, names = self.read()
+        if stamp is None or (not self.trust and time.time() - stamp > self.ttl):
+            return None
+        return names
+
+    def save(self, names, stamp=None):
+        names = set(names)
+        with _lock:
+            self.cached = names
+            if not os.path.isdir(indexdir):
+                os.makedirs(indexdir)
+            fd, tmp = tempfile.mkstemp(dir=indexdir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump({'url': self.url, 'time': stamp or time.time(), 'names': sorted(names)}, f)
+                os.rename(tmp, self.path)
+            except Exception:
+                os.remove(tmp)
+                raise
+
+    def fetch(self):
+        "Rebuild the index from one streamed name listing"
+        result = transport.get(self.url, params={'fields': 'name'}, verify=self.session.certfile, stream=True,
+                               auth=(self.session.username, self.session.password))
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+        self.save(k for k, _ in stream.iter_result(result))
+        return self.cached
+
+    def refresh(self):
+        "Rebuild a cold or stale index in a background thread of long-lived processes"
+        if not background or self.path in _refreshing:
+            return
+        _refreshing.add(self.path)
+
+        def run():
+            try:
+                self.fetch()
+            except Exception:
+                pass
+            finally:
+                _refreshing.discard(self.path)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def lookup(self, names):
+        "Which of names the server has, asked for by name instead of listing everything"
+        names = sorted(set(names))
+        found = set()
+        for i in range(0, len(names), LOOKUP_SIZE):
+            params = {self.param: ','.join(names[i:i+LOOKUP_SIZE]), 'fields': 'name'}
+            result = transport.get(self.url, params=params, verify=self.session.certfile,
+                                   auth=(self.session.username, self.session.password))
+            if result.status_code != requests.codes.ok:
+                raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+            found.update(result.json().get('result', {}).keys())
+        # What we just learned keeps a cached index current
+        asked = set(names)
+        self.update(lambda known: (known | found) - (asked - found))
+        return found
+
+    def names(self):
+        with self.lock:
+            if self.cached is None:
+                self.cached = self.load()
+            if self.cached is None:
+                self.fetch()
+            return self.cached
+
+    def known(self):
+        "Names of a usable cached index, None when cold or stale"
+        with self.lock:
+            if self.cached is None:
+                self.cached = self.load()
+            if self.cached is None:
+                self.refresh()
+            return self.cached
+
+    def missing(self, names):
+        "Names not found, a name absent from the cache is asked for before it is reported"
+        names = set(names)
+        known = self.known()
+        if known is not None:
+            if self.trust:
+                return names - known
+            names = names - known
+        if len(names) == 0:
+            return names
+        return names - self.lookup(names)
+
+    def existing(self, names):
+        "Names already taken, always asked for unless the cache is trusted"
+        names = set(names)
+        if self.trust:
+            known = self.known()
+            if known is not None:
+                return names & known
+        else:
+            self.known()
+        return names & self.lookup(names)
+
+    def update(self, fn):
+        "Apply our own mutation, keeping the age of the index"
+        with _lock:
+            stamp, known = self.read()
+            if stamp is not None:
+                self.save(fn(known), stamp)
+
+    def add(self, names):
+        self.update(lambda known: known | set(names))
+
+    def remove(self, names):
+        self.update(lambda known: known - set(names))
+
+    def clear(self):
+        self.update(lambda known: set())
@@ -0,0 +1,22 @@
+# Client attributes the server computes on demand, requested as dynfields
+DYNFIELDS = {'groups'}
+
+
+def plan(*fieldsets):
+    """Build the fields/dynfields params for the union of fieldsets.
+
+    Commands declare the client attributes they read, and only those are
+    requested so the server does not serialize and send the rest.
+    """
+    wanted = set()
+    for fieldset in fieldsets:
+        wanted.update(fieldset)
+
+    params = {}
+    fields = sorted(x for x in wanted if x not in DYNFIELDS)
+    dynfields = sorted(x for x in wanted if x in DYNFIELDS)
+    if len(fields) > 0:
+        params['fields'] = ','.join(fields)
+    if len(dynfields) > 0:
+        params['dynfields'] = ','.join(dynfields)
+    return params
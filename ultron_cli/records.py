@@ -0,0 +1,43 @@
+import sys
+from types import MappingProxyType
+
+
+EMPTY = MappingProxyType({})
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Client(object):
+    """Compact, read-only client record.
+
+    Listings repeat the same prop keys, values, task names and statuses
+    across thousands of clients. Records keep a single interned copy of
+    each string, only the status of every task, and no per-instance dict.
+    """
+
+    __slots__ = ('name', 'props', 'state', 'tasks', 'groups')
+
+    def __init__(self, name, props=EMPTY, state=EMPTY, tasks=EMPTY, groups=()):
+        self.name = name
+        self.props = props
+        self.state = state
+        self.tasks = tasks
+        self.groups = groups
+
+    @classmethod
+    def from_dict(cls, client):
+        props = client.get('props') or EMPTY
+        state = client.get('state') or EMPTY
+        tasks = client.get('tasks') or EMPTY
+        return cls(
+            client.get('name'),
+            {sys.intern(k): _intern(v) for k, v in props.items()} if props else EMPTY,
+            {sys.intern(k): _intern(v) for k, v in state.items()} if state else EMPTY,
+            {sys.intern(k): sys.intern(v['status']) for k, v in tasks.items()} if tasks else EMPTY,
+            tuple(sys.intern(x) for x in client.get('groups') or ())
+        )
+
+    def __repr__(self):
+        return 'Client({!r})'.format(self.name)
@@ -0,0 +1,127 @@
+import time
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from ultron_cli import transport
+
+
+log = logging.getLogger(__name__)
+
+
+def chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+def plan(names, batch_size=0, canary=0):
+    "Split names into an optional canary wave followed by waves of batch_size"
+    names = list(names)
+    waves = [names[:canary]] if canary > 0 else []
+    rest = names[canary:] if canary > 0 else names
+    waves.extend(chunks(rest, batch_size or len(rest) or 1))
+    return [x for x in waves if len(x) > 0]
+
+
+class Rollout(object):
+    """Submit waves of clients through a bounded worker pool.
+
+    submit(wave) returns how many clients of the wave failed, or raises if
+    the whole wave failed. No new wave is started once the failure ratio
+    of finished waves goes over max_failure_ratio.
+    """
+
+    def __init__(self, submit, concurrency=1, max_failure_ratio=1.0):
+        self.submit = submit
+        self.concurrency = max(concurrency, 1)
+        self.max_failure_ratio = max_failure_ratio
+        self.done = 0
+        self.failed = 0
+        self.stopped = False
+
+    def failure_ratio(self):
+        return float(self.failed) / self.done if self.done > 0 else 0.0
+
+    def finish(self, wave, future):
+        try:
+            failed = future.result()
+        except Exception as e:
+            log.error('Wave of {} clients failed: {}'.format(len(wave), e))
+            failed = len(wave)
+        self.done += len(wave)
+        self.failed += failed
+        log.info('{} clients done, {} failed'.format(self.done, self.failed))
+        if self.failure_ratio() > self.max_failure_ratio:
+            self.stopped = True
+
+    def run(self, waves):
+        "Run the waves, returns False if the rollout was stopped"
+        waves = iter(waves)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self.stopped:
+                for wave in waves:
+                    pending[pool.submit(self.submit, wave)] = wave
+                    if len(pending) >= self.concurrency: break
+                if len(pending) == 0: break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self.finish(pending.pop(future), future)
+
+            # Waves already submitted are let to finish
+            for future in list(pending):
+                self.finish(pending.pop(future), future)
+        return not self.stopped
+
+
+def parallel(fn, items, concurrency):
+    "Call fn on every item with at most concurrency calls at a time, yield (item, future) as they complete"
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        futures = {pool.submit(fn, x): x for x in items}
+        for future in as_completed(futures):
+            yield futures[future], future
+
+
+def task_statuses(session, url, task, names):
+    "Count the statuses of task on the named clients"
+    result = transport.get(url, params={'clientnames': ','.join(names), 'fields': 'name,tasks'},
+                           verify=session.certfile)
+    if result.status_code != requests.codes.ok:
+        raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+    statuses = {}
+    for client in result.json().get('result', {}).values():
+        status = (client.get('tasks') or {}).get(task, {}).get('status', 'UNKNOWN')
+        statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+
+def run_shards(session, url, data, names, shard_size, concurrency):
+    """Run a synchronous task on names split in shards submitted concurrently.
+
+    Each shard is reported as soon as it completes, returns the number of
+    clients that did not succeed.
+    """
+    shards = list(enumerate(chunks(names, shard_size), 1))
+
+    def submit(numbered):
+        _, shard = numbered
+        start = time.time()
+        result = transport.post(url, data=dict(data, clientnames=','.join(shard)), verify=session.certfile,
+                                auth=(session.username, session.password))
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+        return task_statuses(session, url, data['task'], shard), time.time() - start
+
+    failed = 0
+    for (i, shard), future in parallel(submit, shards, concurrency):
+        try:
+            statuses, elapsed = future.result()
+        except Exception as e:
+            log.error('Shard {}/{} of {} clients failed: {}'.format(i, len(shards), len(shard), e))
+            failed += len(shard)
+            continue
+        failed += len(shard) - statuses.get('SUCCESS', 0)
+        print('Shard {}/{}: {} clients, {} ({:.1f}s)'.format(
+            i, len(shards), len(shard), ', '.join('{} {}'.format(v, k) for k, v in sorted(statuses.items())),
+            elapsed))
+    return failed
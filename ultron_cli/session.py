@@ -1,13 +1,8 @@
-import os
-import json
 import logging
 import requests
-from attrdict import AttrDict
 from cliff.command import Command
-from prompt_toolkit import prompt
-
-
-sessionfile = os.path.expanduser('~/.ultron_session.json')
+from cliff.lister import Lister
+from ultron_cli import transport, context
 
 
 class Connect(Command):
@@ -25,7 +20,8 @@ class Connect(Command):
         return parser
 
     def take_action(self, parsed):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        from prompt_toolkit import prompt
+        session = context.session()
 
         if not parsed.endpoint:
             endpoint = prompt('API endpoint: ', default=session.endpoint)
@@ -52,18 +48,11 @@ class Connect(Command):
 
         self.log.info('Connecting to {} as {}...'.format(endpoint, username))
 
-        result = requests.get('{}/admins/{}'.format(endpoint, username),
-                              auth=(username, password), verify=parsed.certfile)
+        result = transport.get('{}/admins/{}'.format(endpoint, username),
+                               auth=(username, password), verify=parsed.certfile)
         if result.status_code == requests.codes.ok:
-            with open(sessionfile, 'w') as f:
-                json.dump({
-                    'endpoint': endpoint,
-                    'username': username,
-                    'password': password,
-                    'certfile': parsed.certfile,
-                    'inventory': inventory
-                }, f, indent=4)
-            os.chmod(sessionfile, 0o600)
+            context.context.update(endpoint=endpoint, username=username, password=password,
+                                   certfile=parsed.certfile, inventory=inventory)
             self.log.info('Connected to Ultron API')
         else:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
@@ -75,7 +64,7 @@ class Disconnect(Command):
     log = logging.getLogger(__name__)
 
     def take_action(self, parsed):
-        os.remove(sessionfile)
+        context.context.remove()
         self.log.info('Disconnected from Ultron API')
 
 class DefaultInventory(Command):
@@ -89,10 +78,65 @@ class DefaultInventory(Command):
         return parser
 
     def take_action(self, parsed):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         if not parsed.inventory:
             print(session.inventory)
             return
-        session['inventory'] = parsed.inventory
-        with open(sessionfile, 'w') as f: json.dump(session, f, indent=4)
-        self.log.info('Default inventory is set as: '+session['inventory'])
+        context.context.update(inventory=parsed.inventory)
+        self.log.info('Default inventory is set as: '+parsed.inventory)
+
+
+class ListProfiles(Lister):
+    "List session profiles"
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed):
+        active = context.context.profile
+        profiles = context.context.profiles()
+        columns = ['name', 'endpoint', 'inventory', 'active']
+        return columns, [[k, v.get('endpoint', ''), v.get('inventory', ''), k == active]
+                         for k, v in sorted(profiles.items())]
+
+
+class NewProfile(Command):
+    "Save a named endpoint/inventory profile, selected with --profile"
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(NewProfile, self).get_parser(prog_name)
+        parser.add_argument('profile')
+        parser.add_argument('endpoint', nargs='?', default=None, help='Endpoint of the current session by default')
+        parser.add_argument('-u', '--username', default=None)
+        parser.add_argument('-p', '--password', default=None)
+        parser.add_argument('-i', '--inventory', default=None)
+        parser.add_argument('-c', '--certfile', default=None)
+        return parser
+
+    def take_action(self, parsed):
+        session = context.session()
+        fields = {'endpoint': parsed.endpoint or session.endpoint,
+                  'inventory': parsed.inventory or session.inventory}
+        for k in ('username', 'password', 'certfile'):
+            if getattr(parsed, k) is not None:
+                fields[k] = getattr(parsed, k)
+        context.context.set_profile(parsed.profile, fields)
+        self.log.info('Saved profile: '+parsed.profile)
+
+
+class DeleteProfile(Command):
+    "Delete a session profile"
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(DeleteProfile, self).get_parser(prog_name)
+        parser.add_argument('profile')
+        return parser
+
+    def take_action(self, parsed):
+        if parsed.profile not in context.context.profiles():
+            raise RuntimeError('ERROR: Profile not found: {}'.format(parsed.profile))
+        context.context.set_profile(parsed.profile, None)
+        self.log.info('Deleted profile: '+parsed.profile)
@@ -0,0 +1,95 @@
+import time
+import shlex
+import requests
+from cliff.interactive import InteractiveApp
+from ultron_cli import transport, context, nameindex, trie
+from ultron_cli.config import NAMES_TTL
+
+
+# Names completed for the positional arguments of a command, the last kind repeats
+ARGUMENTS = {
+    'show client': ['clients'],
+    'update clients': ['clients'],
+    'delete clients': ['clients'],
+    'perform on clients': ['tasks', 'clients'],
+    'stat client tasks': ['tasks'],
+    'filter client task': ['tasks'],
+    'show group': ['groups'],
+    'update groups': ['groups'],
+    'delete groups': ['groups'],
+    'perform on group': ['tasks', 'groups'],
+    'append clients to group': ['groups', 'clients'],
+    'remove clients from group': ['groups', 'clients'],
+    'show admin': ['admins'],
+    'update admins': ['admins'],
+    'delete admins': ['admins'],
+}
+
+# Options taking a name
+OPTIONS = {'-A': 'admins', '--admin': 'admins'}
+
+# Most completions offered at once
+LIMIT = 200
+
+
+class Shell(InteractiveApp):
+    "Interactive shell completing client, group, admin and task names"
+
+    def __init__(self, *args, **kwargs):
+        InteractiveApp.__init__(self, *args, **kwargs)
+        self.tries = {}
+        nameindex.background = True
+
+    def option(self, args, names, default):
+        for i, arg in enumerate(args[:-1]):
+            if arg in names:
+                return args[i + 1]
+        return default
+
+    def names(self, kind, admin, inventory):
+        "Trie of the names of a kind, rebuilt when the name index changes"
+        session = context.session()
+        if kind == 'tasks':
+            key = ('tasks', session.endpoint, admin)
+            cached = self.tries.get(key)
+            if cached is None or time.time() - cached[0] > NAMES_TTL:
+                result = transport.get('{}/admins/{}'.format(session.endpoint, admin),
+                                       params={'fields': 'name', 'dynfields': 'allowed_tasks'},
+                                       verify=session.certfile, auth=(session.username, session.password))
+                if result.status_code != requests.codes.ok:
+                    return trie.Trie()
+                tasks = result.json().get('result', {}).get(admin, {}).get('allowed_tasks', {})
+                cached = self.tries[key] = (time.time(), trie.Trie(tasks))
+            return cached[1]
+
+        index = nameindex.NameIndex(session, kind, admin, inventory)
+        names = index.names()
+        cached = self.tries.get(index.url)
+        if cached is None or cached[0] is not names:
+            cached = self.tries[index.url] = (names, trie.Trie(names))
+        return cached[1]
+
+    def completedefault(self, text, line, begidx, endidx):
+        try:
+            words = shlex.split(line[:begidx])
+            _, name, args = self.command_manager.find_command(words)
+        except ValueError:
+            return InteractiveApp.completedefault(self, text, line, begidx, endidx)
+        session = context.session()
+        admin = self.option(args, ('-A', '--admin'), session.username)
+        inventory = self.option(args, ('-I', '--inventory'), session.inventory)
+        if len(args) > 0 and args[-1] in OPTIONS:
+            kind = OPTIONS[args[-1]]
+        elif name not in ARGUMENTS:
+            return []
+        else:
+            kinds = ARGUMENTS[name]
+            positional = [x for i, x in enumerate(args)
+                          if not x.startswith('-') and (i == 0 or args[i - 1] not in ('-A', '--admin', '-I', '--inventory'))]
+            kind = kinds[min(len(positional), len(kinds) - 1)]
+        try:
+            return self.names(kind, admin, inventory).complete(text, LIMIT)
+        except Exception as e:
+            # A failed lookup must not end the shell
+            self.parent_app.LOG.debug('completion failed: %s', e)
+            return []
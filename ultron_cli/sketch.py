@@ -0,0 +1,67 @@
+import math
+import hashlib
+from collections import OrderedDict
+
+
+def _hash(value):
+    "Stable 64-bit hash of value"
+    digest = hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HyperLogLog(object):
+    "Distinct count estimate in 2**precision bytes, with ~1.04/sqrt(2**precision) error"
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, value):
+        x = _hash(value)
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -x for x in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros > 0:
+            # Small range correction, linear counting is exact enough here
+            return int(round(m * math.log(float(m) / zeros)))
+        return int(round(raw))
+
+
+class SpaceSaving(object):
+    "Heavy hitters among a stream, tracking at most capacity counters"
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}
+
+    def add(self, value):
+        if value in self.counters:
+            self.counters[value] += 1
+        elif len(self.counters) < self.capacity:
+            self.counters[value] = 1
+        else:
+            # Evict the smallest counter, the newcomer inherits its count
+            smallest = min(self.counters, key=self.counters.get)
+            self.counters[value] = self.counters.pop(smallest) + 1
+
+    def top(self, count):
+        "The count most frequent values with their (over)estimated counts"
+        ranked = sorted(self.counters.items(), key=lambda x: -x[1])[:count]
+        return OrderedDict(ranked)
+
+
+def summary(distinct, top, approximate=False):
+    "Display line of a distinct count and the most common values with their counts, e.g. ~12 distinct; top: a=5, b=3"
+    line = '{}{} distinct'.format('~' if approximate else '', distinct)
+    if len(top) > 0:
+        line += '; top: ' + ', '.join('{}={}'.format(k, v) for k, v in top.items())
+    return line
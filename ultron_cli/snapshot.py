@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+from collections import OrderedDict
+import requests
+from cliff.command import Command
+from ultron_cli import transport, stream, projection, sketch, context, trace
+
+
+snapshotfile = os.path.expanduser('~/.ultron_snapshot.db')
+
+# Bump when SCHEMA changes, older snapshots are dropped and re-synced
+SCHEMA_VERSION = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inventories (
+    id INTEGER PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    admin TEXT NOT NULL,
+    inventory TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    UNIQUE (endpoint, admin, inventory)
+);
+CREATE TABLE IF NOT EXISTS clients (
+    inventory_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    groups TEXT NOT NULL,
+    modified TEXT,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (inventory_id, name)
+);
+CREATE TABLE IF NOT EXISTS props (
+    inventory_id INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS props_client ON props (inventory_id, client);
+CREATE INDEX IF NOT EXISTS props_key_value ON props (inventory_id, key, value);
+CREATE TABLE IF NOT EXISTS states (
+    inventory_id INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS states_client ON states (inventory_id, client);
+CREATE INDEX IF NOT EXISTS states_key_value ON states (inventory_id, key, value);
+CREATE TABLE IF NOT EXISTS tasks (
+    inventory_id INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    task TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_client ON tasks (inventory_id, client);
+CREATE INDEX IF NOT EXISTS tasks_task_status ON tasks (inventory_id, task, status);
+'''
+
+
+# Kept open for the life of the process, so the agent reuses it across commands
+_db = None
+
+
+def connect():
+    global _db
+    if _db is not None:
+        return _db
+    db = sqlite3.connect(snapshotfile)
+    if db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        for table in ['inventories', 'clients', 'props', 'states', 'tasks']:
+            db.execute('DROP TABLE IF EXISTS {}'.format(table))
+        db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+    db.executescript(SCHEMA)
+    os.chmod(snapshotfile, 0o600)
+    _db = db
+    return db
+
+
+def inventory_id(db, endpoint, admin, inventory, create=False):
+    row = db.execute('SELECT id FROM inventories WHERE endpoint=? AND admin=? AND inventory=?',
+                     (endpoint, admin, inventory)).fetchone()
+    if row:
+        return row[0]
+    if not create:
+        raise RuntimeError('ERROR: No local snapshot of {}/{}, run: ultron sync -A {} -I {}'.format(
+            admin, inventory, admin, inventory))
+    cur = db.execute('INSERT INTO inventories (endpoint, admin, inventory, synced_at) VALUES (?, ?, ?, ?)',
+                     (endpoint, admin, inventory, 0))
+    return cur.lastrowid
+
+
+def client_hash(client):
+    return hashlib.sha1(json.dumps(client, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def stored_clients(db, inv):
+    "Map of client name to its (modified, hash) as last synced"
+    rows = db.execute('SELECT name, modified, hash FROM clients WHERE inventory_id=?', (inv,))
+    return {x[0]: (x[1], x[2]) for x in rows}
+
+
+def delete_clients(db, inv, names):
+    names = [(inv, x) for x in names]
+    for table, column in [('props', 'client'), ('states', 'client'), ('tasks', 'client'), ('clients', 'name')]:
+        db.executemany('DELETE FROM {} WHERE inventory_id=? AND {}=?'.format(table, column), names)
+
+
+def write_clients(db, inv, clients, modified_field=None):
+    "Insert or replace the given client records of an inventory"
+    delete_clients(db, inv, [x['name'] for x in clients])
+    insert_clients(db, inv, clients, modified_field)
+
+
+def insert_clients(db, inv, clients, modified_field=None):
+    "Insert client records not in the snapshot yet"
+    db.executemany('INSERT INTO clients (inventory_id, name, groups, modified, hash) VALUES (?, ?, ?, ?, ?)',
+                   [(inv, x['name'], json.dumps(x.get('groups') or []),
+                     json.dumps(x[modified_field]) if modified_field in x else None, client_hash(x))
+                    for x in clients])
+    db.executemany('INSERT INTO props (inventory_id, client, key, value, raw) VALUES (?, ?, ?, ?, ?)',
+                   [(inv, x['name'], k, str(v), json.dumps(v))
+                    for x in clients for k, v in (x.get('props') or {}).items()])
+    db.executemany('INSERT INTO states (inventory_id, client, key, value, raw) VALUES (?, ?, ?, ?, ?)',
+                   [(inv, x['name'], k, str(v), json.dumps(v))
+                    for x in clients for k, v in (x.get('state') or {}).items()])
+    db.executemany('INSERT INTO tasks (inventory_id, client, task, status) VALUES (?, ?, ?, ?)',
+                   [(inv, x['name'], k, v['status'])
+                    for x in clients for k, v in (x.get('tasks') or {}).items()])
+
+
+def replace_inventory(db, endpoint, admin, inventory, clients, modified_field=None, batch_size=1000):
+    "Replace the snapshot of an inventory with the clients iterable, returns their count"
+    count, batch = 0, []
+    with db:
+        inv = inventory_id(db, endpoint, admin, inventory, create=True)
+        for table in ['clients', 'props', 'states', 'tasks']:
+            db.execute('DELETE FROM {} WHERE inventory_id=?'.format(table), (inv,))
+        # The inventory was just emptied, nothing to delete before inserting
+        for client in clients:
+            batch.append(client)
+            if len(batch) < batch_size: continue
+            insert_clients(db, inv, batch, modified_field)
+            count, batch = count + len(batch), []
+        insert_clients(db, inv, batch, modified_field)
+        set_synced(db, inv)
+    return count + len(batch)
+
+
+def set_synced(db, inv):
+    db.execute('UPDATE inventories SET synced_at=? WHERE id=?', (time.time(), inv))
+
+
+@trace.traced('snapshot query')
+def stat_tasks(endpoint, admin, inventory, names=()):
+    db = connect()
+    inv = inventory_id(db, endpoint, admin, inventory)
+    tasks = {}
+    for task, status, count in db.execute(
+            'SELECT task, status, COUNT(*) FROM tasks WHERE inventory_id=? GROUP BY task, status ORDER BY MIN(rowid)', (inv,)):
+        if len(names) > 0 and task not in names: continue
+        if task not in tasks:
+            tasks[task] = {
+                'performed on': 0, 'success': 0,
+                'failed': 0, 'pending': 0
+            }
+        tasks[task]['performed on'] += count
+        tasks[task][status.lower()] = tasks[task].get(status.lower(), 0) + count
+    return tasks
+
+
+@trace.traced('snapshot query')
+def _histogram(table, endpoint, admin, inventory, keys):
+    db = connect()
+    inv = inventory_id(db, endpoint, admin, inventory)
+    stats = {}
+    for key, raw, count in db.execute(
+            'SELECT key, raw, COUNT(*) FROM {} WHERE inventory_id=? GROUP BY key, raw ORDER BY MIN(rowid)'.format(table), (inv,)):
+        if len(keys) > 0 and key not in keys: continue
+        if key not in stats: stats[key] = {}
+        stats[key][json.loads(raw)] = count
+
+    for k in list(stats.keys()):
+        if len(stats[k]) > 15:
+            del stats[k]
+    return stats
+
+
+def stat_states(endpoint, admin, inventory, keys=()):
+    return _histogram('states', endpoint, admin, inventory, keys)
+
+
+def stat_props(endpoint, admin, inventory, keys=()):
+    return _histogram('props', endpoint, admin, inventory, keys)
+
+
+@trace.traced('snapshot query')
+def _summary(table, endpoint, admin, inventory, keys, top):
+    db = connect()
+    inv = inventory_id(db, endpoint, admin, inventory)
+    stats = OrderedDict()
+    for key, distinct in db.execute(
+            'SELECT key, COUNT(DISTINCT raw) FROM {} WHERE inventory_id=? GROUP BY key ORDER BY MIN(rowid)'.format(
+                table), (inv,)):
+        if len(keys) > 0 and key not in keys: continue
+        rows = db.execute(
+            'SELECT raw, COUNT(*) AS n FROM {} WHERE inventory_id=? AND key=? GROUP BY raw ORDER BY n DESC, MIN(rowid) LIMIT ?'.format(
+                table), (inv, key, top))
+        stats[key] = sketch.summary(distinct, OrderedDict((json.loads(x[0]), x[1]) for x in rows))
+    return stats
+
+
+def summary_states(endpoint, admin, inventory, keys=(), top=10):
+    return _summary('states', endpoint, admin, inventory, keys, top)
+
+
+def summary_props(endpoint, admin, inventory, keys=(), top=10):
+    return _summary('props', endpoint, admin, inventory, keys, top)
+
+
+@trace.traced('snapshot query')
+def filter_task(endpoint, admin, inventory, task, value):
+    db = connect()
+    inv = inventory_id(db, endpoint, admin, inventory)
+    if value == 'performed on':
+        rows = db.execute('SELECT client FROM tasks WHERE inventory_id=? AND task=?', (inv, task))
+    else:
+        rows = db.execute('SELECT client FROM tasks WHERE inventory_id=? AND task=? AND status=?',
+                          (inv, task, value.upper()))
+    return set(x[0] for x in rows)
+
+
+@trace.traced('snapshot query')
+def filter_state(endpoint, admin, inventory, key, value):
+    db = connect()
+    inv = inventory_id(db, endpoint, admin, inventory)
+    rows = db.execute('SELECT client FROM states WHERE inventory_id=? AND key=? AND value=?',
+                      (inv, key, value))
+    return set(x[0] for x in rows)
+
+
+@trace.traced('snapshot query')
+def filter_prop(endpoint, admin, inventory, key, value):
+    db = connect()
+    inv = inventory_id(db, endpoint, admin, inventory)
+    rows = db.execute('SELECT client FROM props WHERE inventory_id=? AND key=? AND value=?',
+                      (inv, key, value))
+    return set(x[0] for x in rows)
+
+
+class Sync(Command):
+    "Download inventory into the local snapshot"
+
+    log = logging.getLogger(__name__)
+
+    fields = ('name', 'props', 'state', 'tasks', 'groups')
+
+    def get_parser(self, prog_name):
+        session = context.session()
+        parser = super(Sync, self).get_parser(prog_name)
+        parser.add_argument('-A', '--admin', default=session.username)
+        parser.add_argument('-I', '--inventory', default=session.inventory)
+        parser.add_argument('-F', '--full', action='store_true', help='Download everything instead of changes only')
+        parser.add_argument('-B', '--batch-size', type=int, default=200, help='Clients fetched per request')
+        parser.add_argument('-W', '--watermark-field', default='last_modified',
+                            help='Client field holding its last modification time')
+        return parser
+
+    def fetch(self, session, url, params):
+        result = transport.get(url, params=params, verify=session.certfile)
+        if result.status_code != requests.codes.ok:
+            raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+        return result.json().get('result', {})
+
+    def fetch_batches(self, session, url, names, batch_size, params):
+        names = sorted(names)
+        for i in range(0, len(names), batch_size):
+            params = dict(params, clientnames=','.join(names[i:i+batch_size]))
+            for client in self.fetch(session, url, params).values():
+                yield client
+
+    def take_action(self, p):
+        session = context.session()
+
+        url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
+        params = projection.plan(self.fields, [p.watermark_field])
+        db = connect()
+
+        with db:
+            inv = inventory_id(db, session.endpoint, p.admin, p.inventory, create=True)
+            stored = stored_clients(db, inv)
+
+        if p.full or len(stored) == 0:
+            result = transport.get(url, params=params, verify=session.certfile, stream=True)
+            if result.status_code != requests.codes.ok:
+                raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+            clients = (x for _, x in stream.iter_result(result))
+            count = replace_inventory(db, session.endpoint, p.admin, p.inventory, clients, p.watermark_field)
+            print('SUCCESS: Synced {} clients'.format(count))
+            return
+
+        # Only names and modification times, the rest is fetched for changed clients only
+        listing = self.fetch(session, url, projection.plan(['name', p.watermark_field]))
+        removed = set(stored.keys()) - set(listing.keys())
+
+        if all(p.watermark_field in x for x in listing.values()):
+            changed = [k for k, v in listing.items()
+                       if k not in stored or stored[k][0] != json.dumps(v[p.watermark_field])]
+            clients = list(self.fetch_batches(session, url, changed, p.batch_size, params))
+        else:
+            # Server has no modification times, compare content hashes over one streamed listing
+            self.log.debug('{} not supported by server, comparing hashes'.format(p.watermark_field))
+            result = transport.get(url, params=params, verify=session.certfile, stream=True)
+            if result.status_code != requests.codes.ok:
+                raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+            clients = [x for _, x in stream.iter_result(result)
+                       if x['name'] not in stored or stored[x['name']][1] != client_hash(x)]
+
+        with db:
+            delete_clients(db, inv, removed)
+            write_clients(db, inv, clients, p.watermark_field)
+            set_synced(db, inv)
+
+        print('SUCCESS: Synced {} changed and {} removed clients'.format(len(clients), len(removed)))
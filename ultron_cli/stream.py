@@ -0,0 +1,107 @@
+import json
+import codecs
+from ultron_cli import trace
+
+
+WHITESPACE = ' \t\n\r'
+
+# Characters continuing a number, never valid right after a complete value
+NUMBER = '0123456789+-.eE'
+
+
+class _Reader(object):
+    "Incremental JSON reader over the chunks of a streamed response"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        if self.eof:
+            raise ValueError('Unexpected end of JSON document')
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        for chunk in self.chunks:
+            if chunk:
+                self.buf += self.decoder.decode(chunk)
+                return
+        self.buf += self.decoder.decode(b'', final=True)
+        self.eof = True
+
+    def peek(self):
+        "Next non-whitespace character, without consuming it"
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self.more()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expecting {!r} at: {!r}'.format(char, self.buf[self.pos:self.pos+20]))
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                self.more()
+                continue
+            # A number or literal may continue in the next chunk, "12." decodes as 12
+            if not self.eof and (end == len(self.buf) or self.buf[end] in NUMBER):
+                self.more()
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        "Yield the (key, value) pairs of the object starting at the cursor"
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+
+def iter_result(response, key='result', chunk_size=64 * 1024):
+    """Yield the (name, record) pairs of the response's result object.
+
+    Records are decoded one at a time while the body is being downloaded,
+    so memory use does not grow with the size of the listing. The response
+    should be requested with stream=True.
+    """
+    if trace.tracer is None:
+        return _iter_result(response, key, response.iter_content(chunk_size))
+    counts = {'read': 0.0, 'bytes': 0}
+    chunks = trace.chunks(response.iter_content(chunk_size), counts)
+    return trace.records(_iter_result(response, key, chunks), counts)
+
+
+def _iter_result(response, key, chunks):
+    reader = _Reader(chunks)
+    try:
+        for member in reader.members():
+            if member != key:
+                reader.value()
+                continue
+            for name in reader.members():
+                yield name, reader.value()
+    finally:
+        response.close()
@@ -1,13 +1,9 @@
-import os
 import json
 import logging
 import requests
-from attrdict import AttrDict
 from cliff.command import Command
 from cliff.show import ShowOne
-
-
-sessionfile = os.path.expanduser('~/.ultron_session.json')
+from ultron_cli import transport, context
 
 
 class Submit(Command):
@@ -16,7 +12,7 @@ class Submit(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Submit, self).get_parser(prog_name)
         parser.add_argument('task')
         parser.add_argument('-A', '--admin', default=session.username)
@@ -26,7 +22,7 @@ class Submit(Command):
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         data = {'async': int(not p.synchronous), 'task': p.task}
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
         if len(p.kwargs) > 0:
@@ -34,7 +30,7 @@ class Submit(Command):
                 raise RuntimeError('kwargs: Must BSON encoded key-value pairs')
             data['kwargs'] = json.dumps(p.kwargs)
 
-        result = requests.post(url, data=data, verify=session.certfile, auth=(session.username, session.password))
+        result = transport.post(url, data=data, verify=session.certfile, auth=(session.username, session.password))
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
@@ -47,7 +43,7 @@ class Stat(ShowOne):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         parser = super(Stat, self).get_parser(prog_name)
         parser.add_argument('task')
         parser.add_argument('-A', '--admin', default=session.username)
@@ -55,10 +51,10 @@ class Stat(ShowOne):
         return parser
 
     def take_action(self, p):
-        with open(sessionfile) as f: session = AttrDict(json.load(f))
+        session = context.session()
         url = '{}/clients/{}/{}'.format(session.endpoint, p.admin, p.inventory)
 
-        result = requests.get(url, verify=session.certfile)
+        result = transport.get(url, verify=session.certfile)
         if result.status_code != requests.codes.ok:
             raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
 
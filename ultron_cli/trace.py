@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import functools
+import threading
+from urllib.parse import urlsplit
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# The active Tracer, None unless a command runs with --trace
+tracer = None
+
+
+class Tracer(object):
+    "Spans recorded while commands run"
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, name, cat, start, duration, **args):
+        with self.lock:
+            self.spans.append((name, cat, start, duration, threading.current_thread().ident, args))
+
+    @contextmanager
+    def span(self, name, cat='compute', **args):
+        "Record the time of the block, args may be filled in by the block"
+        start = time.time()
+        try:
+            yield args
+        finally:
+            self.add(name, cat, start, time.time() - start, **args)
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+
+    def summary(self):
+        "Rows of (span, calls, total ms, mean ms, max ms, bytes) in order of first use"
+        rows = OrderedDict()
+        for name, cat, start, duration, tid, args in self.spans:
+            row = rows.setdefault(name, [name, 0, 0.0, 0.0, 0.0, 0])
+            row[1] += 1
+            row[2] += duration * 1000
+            row[4] = max(row[4], duration * 1000)
+            row[5] += args.get('bytes', 0)
+        for row in rows.values():
+            row[3] = row[2] / row[1]
+        return list(rows.values())
+
+    def render(self, out):
+        rows = self.summary()
+        width = max([len(x[0]) for x in rows] + [4])
+        out.write('{:{w}}  {:>6}  {:>10}  {:>9}  {:>9}  {:>10}\n'.format(
+            'span', 'calls', 'total ms', 'mean ms', 'max ms', 'bytes', w=width))
+        for row in rows:
+            out.write('{:{w}}  {:6d}  {:10.1f}  {:9.1f}  {:9.1f}  {:10d}\n'.format(*row, w=width))
+
+    def chrome(self):
+        "Chrome trace-event document, for chrome://tracing or Perfetto"
+        origin = min([x[2] for x in self.spans] or [0])
+        return {'traceEvents': [{
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+            'ts': int((start - origin) * 1e6), 'dur': int(duration * 1e6), 'args': args
+        } for name, cat, start, duration, tid, args in self.spans]}
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome(), f)
+
+
+def enable(on=True):
+    global tracer
+    tracer = Tracer() if on else None
+    if on:
+        _patch_urllib3()
+
+
+@contextmanager
+def span(name, cat='compute', **args):
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, cat, **args) as args:
+        yield args
+
+
+def traced(name, cat='compute'):
+    "Decorator recording a span for every call while tracing"
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if tracer is None:
+                return fn(*args, **kwargs)
+            with tracer.span(name, cat):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def request(session, method, url, kwargs):
+    "Send a request recording its time to first byte, size and JSON decode time"
+    with tracer.span('{} {}'.format(method, urlsplit(url).path), 'http') as args:
+        response = session.request(method, url, **kwargs)
+        args['status'] = response.status_code
+        args['ttfb_ms'] = response.elapsed.total_seconds() * 1000
+        if kwargs.get('stream'):
+            return response
+        args['bytes'] = len(response.content)
+
+    decode = response.json
+
+    def timed_json(**kw):
+        with span('json decode', 'decode', bytes=len(response.content)):
+            return decode(**kw)
+    response.json = timed_json
+    return response
+
+
+def chunks(iterable, counts):
+    "Yield the chunks of a streamed body, adding read time and bytes to counts"
+    iterator = iter(iterable)
+    while True:
+        start = time.time()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            counts['read'] += time.time() - start
+        counts['bytes'] += len(chunk)
+        yield chunk
+
+
+def records(iterable, counts):
+    """Yield the records of a streamed body and split its time in spans.
+
+    stream read is waiting for the network, stream decode parsing JSON and
+    stream consumer the caller's own work per record, like aggregation.
+    """
+    start = time.time()
+    inside = 0.0
+    count = 0
+    try:
+        for_start = time.time()
+        for record in iterable:
+            inside += time.time() - for_start
+            count += 1
+            yield record
+            for_start = time.time()
+        inside += time.time() - for_start
+    finally:
+        total = time.time() - start
+        if tracer is not None:
+            tracer.add('stream read', 'http', start, counts['read'], bytes=counts['bytes'])
+            tracer.add('stream decode', 'decode', start, max(inside - counts['read'], 0), records=count)
+            tracer.add('stream consumer', 'compute', start, max(total - inside, 0), records=count)
+
+
+def _patch_urllib3():
+    "Record connection setup, new connections only as pooled ones are reused"
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    if getattr(HTTPConnection, '_ultron_traced', False):
+        return
+
+    new_conn = HTTPConnection._new_conn
+    connect = HTTPSConnection.connect
+
+    @functools.wraps(new_conn)
+    def traced_new_conn(self):
+        if tracer is None:
+            return new_conn(self)
+        try:
+            with tracer.span('dns+tcp connect', 'http', host=self.host):
+                return new_conn(self)
+        finally:
+            self._ultron_connected = time.time()
+
+    @functools.wraps(connect)
+    def traced_connect(self):
+        if tracer is None:
+            return connect(self)
+        self._ultron_connected = time.time()
+        try:
+            return connect(self)
+        finally:
+            # connect opens the socket through _new_conn, already its own span, the rest is the handshake
+            tls = self._ultron_connected
+            tracer.add('tls connect', 'http', tls, time.time() - tls, host=self.host)
+
+    HTTPConnection._new_conn = traced_new_conn
+    HTTPSConnection.connect = traced_connect
+    HTTPConnection._ultron_traced = True
@@ -0,0 +1,66 @@
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from ultron_cli import trace
+from ultron_cli.config import POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT
+
+
+_sessions = {}
+_lock = threading.Lock()
+
+# Requests sent that may change the server, anything but GET
+changes = 0
+
+
+def get_session(url, certfile=False):
+    """Return the pooled session for the endpoint of url and certfile.
+
+    Sessions keep their connections alive, so consecutive calls to the
+    same API reuse the TCP connection and TLS session instead of
+    handshaking again.
+    """
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc, certfile)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.verify = certfile
+            _sessions[key] = session
+    return session
+
+
+def request(method, url, **kwargs):
+    global changes
+    if method != 'GET':
+        with _lock:
+            changes += 1
+    kwargs.setdefault('verify', False)
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    session = get_session(url, kwargs['verify'])
+    if trace.tracer is not None:
+        return trace.request(session, method, url, kwargs)
+    return session.request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+def close():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
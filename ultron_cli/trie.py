@@ -0,0 +1,50 @@
+class Trie(object):
+    "Prefix index of names, for completion"
+
+    def __init__(self, words=()):
+        self.root = {}
+        self.size = 0
+        self.update(words)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        node = self.find(word)
+        return node is not None and None in node
+
+    def add(self, word):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        if None not in node:
+            # None marks the end of a word, other keys are characters
+            node[None] = True
+            self.size += 1
+
+    def update(self, words):
+        for word in words:
+            self.add(word)
+
+    def find(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix, limit=None):
+        "Words starting with prefix in sorted order, at most limit of them"
+        node = self.find(prefix)
+        if node is None:
+            return []
+        words = []
+        stack = [(prefix, node)]
+        while stack and (limit is None or len(words) < limit):
+            word, node = stack.pop()
+            if None in node:
+                words.append(word)
+            # Pushed in reverse so the smallest character is popped first
+            stack.extend((word + k, node[k]) for k in sorted((x for x in node if x is not None), reverse=True))
+        return words
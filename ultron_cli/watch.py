@@ -0,0 +1,97 @@
+import time
+import logging
+import requests
+from ultron_cli import transport, rollout
+
+
+log = logging.getLogger(__name__)
+
+FINISHED = ('SUCCESS', 'FAILED')
+
+
+class Watcher(object):
+    """Poll the status of a task on the given clients until it finishes.
+
+    Only clients still pending are queried, in batches and projected to
+    their tasks, and clients no longer listed count as failed. The poll
+    interval doubles while nothing changes and is reset as soon as some
+    client finishes.
+    """
+
+    def __init__(self, session, url, task, names, batch_size=200,
+                 interval=1.0, max_interval=30.0, timeout=None, out=None):
+        self.session = session
+        self.url = url
+        self.task = task
+        self.pending = set(names)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.out = out
+        self.success = 0
+        self.failed = 0
+        self.line = None
+
+    def poll(self):
+        "Query pending clients once, returns how many finished since last poll"
+        finished = 0
+        for batch in rollout.chunks(sorted(self.pending), self.batch_size):
+            result = transport.get(self.url, params={'clientnames': ','.join(batch), 'fields': 'name,tasks'},
+                                   verify=self.session.certfile)
+            if result.status_code != requests.codes.ok:
+                raise RuntimeError('ERROR: {}: {}'.format(result.status_code, result.json().get('message')))
+            clients = result.json().get('result', {})
+            for name in batch:
+                # A client missing from the result was deleted, its task will never finish
+                status = (clients[name].get('tasks') or {}).get(self.task, {}).get('status') \
+                    if name in clients else 'FAILED'
+                if status not in FINISHED: continue
+                self.pending.discard(name)
+                if status == 'SUCCESS':
+                    self.success += 1
+                else:
+                    self.failed += 1
+                finished += 1
+        return finished
+
+    def render(self):
+        if self.out is None: return
+        line = 'SUCCESS: {}  FAILED: {}  PENDING: {}'.format(self.success, self.failed, len(self.pending))
+        if self.out.isatty():
+            self.out.write('\r' + line)
+            self.out.flush()
+        elif line != self.line:
+            self.out.write(line + '\n')
+        self.line = line
+
+    def run(self):
+        "Watch until done, returns 0 if all succeeded, 1 if some failed, 2 on timeout"
+        start = time.time()
+        interval = self.interval
+        while True:
+            progressed = self.poll() > 0
+            self.render()
+            if len(self.pending) == 0: break
+            if self.timeout and time.time() - start + interval > self.timeout: break
+            interval = self.interval if progressed else min(interval * 2, self.max_interval)
+            time.sleep(interval)
+
+        if self.out is not None and self.out.isatty():
+            self.out.write('\n')
+        if len(self.pending) > 0:
+            return 2
+        return 1 if self.failed > 0 else 0
+
+
+def wait(session, url, task, names, timeout=None, out=None):
+    "Watch the clients until the task finishes on all, report and return the exit code"
+    watcher = Watcher(session, url, task, names, timeout=timeout, out=out)
+    code = watcher.run()
+    if code == 0:
+        print('SUCCESS: Task finished on {} clients'.format(watcher.success))
+    elif code == 1:
+        log.error('ERROR: Task failed on {} of {} clients'.format(watcher.failed, watcher.success + watcher.failed))
+    else:
+        log.error('ERROR: Timed out with {} clients pending'.format(len(watcher.pending)))
+    return code